@@ -0,0 +1,41 @@
+import numpy as np, pandas as pd
+
+class cluster_report:
+    # Summary of discovered clusters: the rows in each cluster, their labels & how many of each label each cluster has
+    # Printing a report (or str) gives the same text as before: label counts if the data is classified, otherwise the labels
+    # of every row in each cluster
+    def __init__(self, labels, row_labels, members, classified = False):
+        # labels: every distinct label, in the order they are reported
+        # row_labels: index into labels of the label of every row
+        # members: array of the rows in each cluster, in order
+        self.labels = list(labels)
+        self.members = [np.asarray(rows, dtype=np.int64) for rows in members]
+        self.classified = classified
+        self.__row_labels = np.asarray(row_labels, dtype=np.int64)
+
+        # Labels are counted for all clusters at once, as (cluster number * number of labels + label)
+        clusters = np.repeat(np.arange(len(self.members)), [len(rows) for rows in self.members])
+        rows = np.concatenate(self.members) if self.members else np.zeros(0, dtype=np.int64)
+        self.label_counts = np.bincount(clusters * len(self.labels) + self.__row_labels[rows],
+                                        minlength=len(self.members) * len(self.labels)).reshape(len(self.members), len(self.labels))
+
+    def __len__(self):
+        return len(self.members)
+
+    def get_member_labels(self, cluster):
+        # Labels of the rows in a cluster (numbered from 0), in order
+        return [self.labels[label] for label in self.__row_labels[self.members[cluster]].tolist()]
+
+    def to_frame(self):
+        # Label counts as a dataframe with a row per cluster (numbered from 1) & a column per label
+        return pd.DataFrame(self.label_counts, index=pd.RangeIndex(1, len(self.members) + 1, name='cluster'), columns=self.labels)
+
+    def __str__(self):
+        output = []
+        if self.classified == True:
+            for number, counts in enumerate(self.label_counts.tolist()):
+                output.append(f"Cluster {number + 1}: " + "".join(f"{count} {label}, " for count, label in zip(counts, self.labels)) + "\b\b.\n")
+        else:
+            for number in range(len(self.members)):
+                output.append(f"Cluster {number + 1}:\n" + "".join(f"\t{label}\n" for label in self.get_member_labels(number)))
+        return "".join(output)
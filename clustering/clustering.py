@@ -1,54 +1,266 @@
-import os, sys, pandas as pd, numpy as np, heapq_max as hmax
+import os, time, copy, pickle, tempfile, pandas as pd, numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from scipy import sparse
+from indexed_heap import indexed_max_heap, HEAP_BYTES_PER_ENTRY
+from itertools import islice
+from cluster_report import cluster_report
+from link_store import create_link_store, create_link_file, open_link_snapshot, dense_link_store, get_dense_memory_usage, SPARSE_BYTES_PER_LINK
 from tqdm import tqdm, trange
 from collections import OrderedDict
 
+# Function to count the rows of a csv file, not including the header
+# Rows are counted by parsing only the first column, as quoted row labels may contain line breaks
+def count_csv_rows(filepath, chunk_size = 100000):
+    return sum(len(chunk.index) for chunk in pd.read_csv(filepath, usecols=[0], chunksize=chunk_size))
+
+# Function to create a dataframe of row labels (numbered from 0 if None) followed by values, from a NumPy array or a
+# scipy.sparse matrix, which is kept in pandas' sparse format
+def create_dataframe(values, labels = None, columns = None, label_name = 'label'):
+    if sparse.issparse(values):
+        frame = pd.DataFrame.sparse.from_spmatrix(values, columns=columns)
+    else:
+        frame = pd.DataFrame(values, columns=columns)
+    frame.insert(0, label_name, np.arange(len(frame.index)) if labels is None else list(labels), allow_duplicates=True)
+    return frame
+
+# Function to read a dataset .csv file a chunk of rows at a time, yielding the row labels (first column) & a uint8 array with
+# a 1 wherever a value is 1. Only values of 1 count towards similarity, so nothing else about the values needs to be kept
+def read_csv_chunks(filepath, chunk_size = 10000, skiprows = None):
+    for chunk in pd.read_csv(filepath, chunksize=chunk_size, skiprows=skiprows):
+        yield chunk.iloc[:, 0].tolist(), (chunk.iloc[:, 1:].to_numpy() == 1).astype(np.uint8)
+
+# Function to load a dataset .csv file of 0/1 values (e.g. one saved by the dataset builder) as a dataframe of row labels followed
+# by uint8 values, read a chunk at a time (see read_csv_chunks), instead of int64 values. If sparse_values is True, the values
+# are kept in pandas' sparse format, so only the 1s take up memory. skiprows is passed to pd.read_csv
+def load_csv(filepath, chunk_size = 10000, sparse_values = False, skiprows = None):
+    header = pd.read_csv(filepath, nrows=0).columns
+    labels, values = [], []
+    for chunk_labels, chunk_values in read_csv_chunks(filepath, chunk_size, skiprows):
+        labels.extend(chunk_labels)
+        values.append(sparse.csr_matrix(chunk_values) if sparse_values else chunk_values)
+    if len(values) == 0:
+        values = [np.zeros((0, len(header) - 1), dtype=np.uint8)]
+    values = sparse.vstack(values, format='csr') if sparse_values else np.concatenate(values)
+    return create_dataframe(values, labels, header[1:], header[0])
+
+# Function to find the binary matrix of a dataframe whose values are all in pandas' sparse format, without making them dense
+# Returns None if any values are not sparse
+def get_sparse_binary_matrix(frame):
+    values = frame.iloc[:, 1:]
+    if len(values.columns) == 0 or not all(isinstance(dtype, pd.SparseDtype) for dtype in values.dtypes):
+        return None
+    return sparse.csr_matrix(values.sparse.to_coo() == 1, dtype=np.int32)
+
+# Function to convert a sparse matrix of similarities between neighbours into an adjacency matrix
+def get_adjacency(similarity):
+    return sparse.csr_matrix((np.ones(similarity.nnz, dtype=np.int32), similarity.indices, similarity.indptr), shape=similarity.shape)
+
+# Function to pair every element of an array with each later element having the same key
+# Returns the two positions (into keys) of every pair, with the first position of each pair the smaller
+def get_pairs_with_equal_keys(keys):
+    order = np.argsort(keys, kind='stable')
+    starts = np.flatnonzero(np.r_[True, np.diff(keys[order]) != 0]) if len(order) else np.zeros(0, dtype=np.int64)
+    sizes = np.diff(np.r_[starts, len(order)])
+    num_pairs = np.repeat(starts + sizes, sizes) - np.arange(len(order)) - 1
+    first = np.repeat(np.arange(len(order)), num_pairs)
+    second = first + 1 + np.arange(num_pairs.sum()) - np.repeat(np.cumsum(num_pairs) - num_pairs, num_pairs)
+    return np.minimum(order[first], order[second]), np.maximum(order[first], order[second])
+
+# Function to remove the links of each point with itself from a link matrix, as they are never used
+def remove_self_links(link):
+    link = (link - sparse.diags(link.diagonal(), dtype=link.dtype)).tocsr()
+    link.eliminate_zeros()
+    return link
+
+# Function to cluster a dataset at several thresholds, computing the similarities between its points only once
+# Pairs of points at least as similar as the lowest threshold are sorted by similarity, so the neighbours at each threshold
+# are the most similar pairs down to that threshold. Going from the highest threshold to the lowest, the pairs added (D) grow
+# the adjacency matrix (A) & the link matrix by A·D + D·A + D·D, instead of the link matrix being computed again
+# The clusterings themselves are run in a pool of processes (by default, one per CPU). Other options are passed to ROCK
+# Returns a dictionary of clustered ROCK instances, keyed by threshold
+def sweep_thresholds(dataset, thresholds, num_clusters, classified = False, binarize = False, processes = None, **options):
+    thresholds = sorted(set(float(threshold) for threshold in thresholds), reverse=True)
+    base = ROCK(dataset, thresholds[-1], num_clusters, classified, binarize, **options)
+    similarity = sparse.triu(base.create_neighbour_matrix(similarity=True), k=1).tocoo()
+    order = np.argsort(-similarity.data, kind='stable')
+    rows, columns, values = similarity.row[order], similarity.col[order], similarity.data[order]
+
+    size = similarity.shape[0]
+    adj = sparse.csr_matrix((size, size), dtype=np.int32)
+    link = sparse.csr_matrix((size, size), dtype=np.int32)
+    results = {}
+    with ProcessPoolExecutor(processes) as executor:
+        start = 0
+        for threshold in tqdm(thresholds, desc="Computing links for each threshold"):
+            # values are sorted from highest to lowest, so the pairs at least as similar as the threshold come first
+            end = int(np.searchsorted(-values, -threshold, side='right'))
+            added = sparse.csr_matrix((np.ones(end - start, dtype=np.int32), (rows[start:end], columns[start:end])), shape=(size, size))
+            added = (added + added.T).tocsr()
+            link = (link + adj @ added + added @ adj + added @ added).tocsr()
+            adj = (adj + added).tocsr()
+            start = end
+            results[threshold] = executor.submit(cluster_with_link, base.with_threshold(threshold), remove_self_links(link))
+        return {threshold: results[threshold].result() for threshold in sorted(results)}
+
+# Function to cluster a ROCK instance with a link matrix computed elsewhere, returning the instance (used by sweep_thresholds)
+def cluster_with_link(instance, link):
+    instance.cluster(link=link)
+    return instance
+
 class ROCK:
     # Constructor
-    def __init__(self, filename, threshold, num_clusters, classified = False, binarize = False):
-        filepath = f"./datasets/{filename}.csv"
-        # Check if dataset present in datasets directory
-        if os.path.isfile(filepath):
-            # Binarize dataset into 1/0 values if necessary
-            if binarize == True:
-                self.__data = self.binarize_data(pd.read_csv(filepath))
-            else:
-                self.__data = pd.read_csv(filepath)
-            self.__classified = classified
-            self.__data_size = len(self.__data.index)
-            self.__desired_num_clusters = int(num_clusters)
-            self.__threshold = float(threshold)
-            self.__expected_links_exponent =  1.0 + (2.0 * ( (1.0 - threshold) / (1.0 + threshold)))
-
-            # Each cluster starts out as a singleton list within a dictionary (i.e. {1 : [1], 2: [2], ...})
-            self.__clusters = dict(zip(range(self.__data_size),[[index] for index in range(self.__data_size)]))
-            self.__link = None
-            self.__local_heaps = None
-            self.__global_heap = None
+    # dataset is either the name of a .csv file in the ./datasets directory, or the data itself: a dataframe, NumPy array or
+    # scipy.sparse matrix, which can be passed straight from the dataset builder without saving it. Row labels are the first
+    # column of a dataframe (or its index, if that is not just the row numbers), unless they are given as labels, which is how
+    # the labels of an array or matrix are given (with the names of its columns as columns). Otherwise rows are numbered from 0
+    # Values of a .csv file are read in chunks as uint8 (see load_csv), unless the data needs to be binarized
+    def __init__(self, dataset, threshold, num_clusters, classified = False, binarize = False, approximate = False, num_hashes = 128, lsh_recall = 0.95, seed = 0, sample_size = None, link_store = 'auto', memory_budget = None, link_directory = None, labels = None, columns = None):
+        if isinstance(dataset, str):
+            # Check if dataset present in datasets directory
+            self.__source = f"./datasets/{dataset}.csv"
+            if not os.path.isfile(self.__source):
+                raise FileNotFoundError(f"File {dataset} not in ./datasets directory.")
         else:
-            # Halt execution if specified dataset file does not exist
-            print(f"File {filename} not in ./datasets directory.")
-            sys.exit()
-
-    def binarize_data(self, csv):
-        # To binarize data, loop over initial columns
-        # extract all possible values for each column
-        # create new columns, one for each possible value (ignoring missing data represented by '?')
-        # populate each new column with 1 representing the original value (e.g. 'y') and 0 for all others
-        # delete original column
-
-        df = csv
-        initial_cols = csv.columns.tolist()[1:] # removes row label (conference name)
-        pbar = tqdm(total = len(initial_cols), desc='Binarizing data')
-        for col in initial_cols:
-            initial_values = csv[col].unique().tolist()
-            for value in initial_values:
-                if value != '?':
-                    new_col = col + "_" + value
-                    df[new_col] = [1 if x == value else 0 for x in csv.loc[:, col]]
-            del df[col]
-            pbar.update(1)
-        pbar.close()
-        return df
+            self.__source = self.get_input_dataframe(dataset, labels, columns)
+
+        # If a sample size is given, only a random sample of the rows is read & clustered (see label_remaining_data)
+        self.__binarize = binarize
+        self.__sample_rows = self.choose_sample_rows(sample_size, seed) if sample_size is not None else None
+        csv = self.read_data()
+
+        # Binarize dataset into 1/0 values if necessary, keeping the binary matrix used to find neighbours
+        if binarize == True:
+            self.__binary, names = self.encode_categories(csv)
+            self.__data = self.binarize_data(csv, (self.__binary, names))
+        else:
+            self.__binary = get_sparse_binary_matrix(csv)
+            self.__data = csv
+        self.__label_codes = None
+        self.__classified = classified
+        self.__data_size = len(self.__data.index)
+        self.__desired_num_clusters = int(num_clusters)
+        self.set_threshold(threshold)
+
+        # Settings for finding neighbours approximately with MinHash signatures & locality sensitive hashing (see create_approximate_adjacency_matrix)
+        self.__approximate = approximate
+        self.__num_hashes = int(num_hashes)
+        self.__lsh_recall = float(lsh_recall)
+        self.__seed = seed
+
+        # Form of link storage used while merging clusters ('dense', 'sparse', 'memmap' or 'auto' to choose whichever needs less memory)
+        # If a memory budget (in bytes) is given, the link matrix is built & processed in blocks that fit within it, and with
+        # link_store 'auto' it is kept on disk in link_directory when it would not fit in memory
+        self.__link_store = link_store
+        self.__memory_budget = memory_budget
+        self.__link_directory = link_directory
+
+        # Each cluster starts out as a singleton list within a dictionary (i.e. {1 : [1], 2: [2], ...})
+        self.__clusters = dict(zip(range(self.__data_size),[[index] for index in range(self.__data_size)]))
+        self.__link = None
+        self.__cluster_sizes = None
+        self.__num_merges = 0
+        # Every merge made, as (cluster_i, cluster_j, goodness, size of the merged cluster), & the clusters before merging
+        # (see cut & get_merge_history)
+        self.__merge_history = []
+        self.__initial_clusters = None
+        self.__local_heaps = None
+        self.__global_heap = None
+        self.__assignments = None
+        self.__row_labels = None
+
+    def set_threshold(self, threshold):
+        self.__threshold = float(threshold)
+        self.__expected_links_exponent =  1.0 + (2.0 * ( (1.0 - threshold) / (1.0 + threshold)))
+        # n ^ (1 + 2f(θ)) for every cluster size n, used to calculate the expected number of links between clusters
+        self.__expected_links = np.array([size ** self.__expected_links_exponent for size in range(self.__data_size + 1)])
+
+    def with_threshold(self, threshold):
+        # Copy of this instance (sharing its data) with a different threshold, before clustering
+        instance = copy.copy(self)
+        instance.set_threshold(threshold)
+        instance.__clusters = dict(zip(range(self.__data_size),[[index] for index in range(self.__data_size)]))
+        return instance
+
+    def get_input_dataframe(self, dataset, labels, columns):
+        # Dataframe of row labels followed by values, from data given to the constructor
+        if not isinstance(dataset, pd.DataFrame):
+            return create_dataframe(dataset, labels, columns)
+        if labels is not None:
+            frame = dataset.copy(deep=False)
+            frame.insert(0, 'label', list(labels), allow_duplicates=True)
+            return frame
+        if not isinstance(dataset.index, pd.RangeIndex):
+            return dataset.reset_index()
+        return dataset
+
+    def count_rows(self):
+        # Number of rows in the dataset, including any not sampled
+        if isinstance(self.__source, str):
+            return count_csv_rows(self.__source)
+        return len(self.__source.index)
+
+    def read_data(self):
+        # Read the rows of the dataset to be clustered (only the sample, if there is one)
+        if not isinstance(self.__source, str):
+            if self.__sample_rows is None:
+                return self.__source
+            return self.__source.iloc[self.__sample_rows].reset_index(drop=True)
+        skiprows = None
+        if self.__sample_rows is not None:
+            sample = set(self.__sample_rows.tolist())
+            skiprows = lambda row: row > 0 and row - 1 not in sample
+        if self.__binarize == True:
+            return pd.read_csv(self.__source, skiprows=skiprows)
+        return load_csv(self.__source, skiprows=skiprows)
+
+    def read_chunks(self, chunk_size):
+        # Generator reading every row of the dataset a chunk at a time, each as a dataframe like those of read_data
+        if not isinstance(self.__source, str):
+            for start in range(0, len(self.__source.index), chunk_size):
+                yield self.__source.iloc[start:start + chunk_size]
+        elif self.__binarize == True:
+            yield from pd.read_csv(self.__source, chunksize=chunk_size)
+        else:
+            header = pd.read_csv(self.__source, nrows=0).columns
+            for labels, values in read_csv_chunks(self.__source, chunk_size):
+                yield create_dataframe(values, labels, header[1:], header[0])
+
+    def choose_sample_rows(self, sample_size, seed):
+        # Choose which rows of the dataset to cluster, returning their row numbers (not counting the header) in order
+        # sample_size may be a number of rows or, if less than 1, a fraction of the rows. Returns None if every row is chosen
+        num_rows = self.count_rows()
+        sample_size = int(round(sample_size * num_rows)) if sample_size < 1 else int(sample_size)
+        if sample_size >= num_rows:
+            return None
+        return np.sort(np.random.default_rng(seed).choice(num_rows, size=sample_size, replace=False))
+
+    def encode_categories(self, csv):
+        # One-hot encode every column of a dataframe except the first (the row label), returning a sparse (CSR) binary matrix
+        # & the names of its columns. Each column is replaced with one new column per value (col_value, in order of appearance),
+        # found from pandas' categorical codes, with no column for missing data (represented by '?')
+        codes, names, num_columns = [], [], 0
+        for col in csv.columns.tolist()[1:]:
+            col_codes, values = pd.factorize(csv[col])
+            present = np.array([value != '?' for value in values.tolist()], dtype=bool)
+            # codes of the new columns, with -1 for missing data (pandas gives empty cells the code -1, the last element)
+            new_codes = np.append(np.where(present, np.cumsum(present) - 1 + num_columns, -1), -1).astype(np.int32)
+            codes.append(new_codes[col_codes])
+            names.extend(f"{col}_{value}" for value, is_present in zip(values.tolist(), present) if is_present)
+            num_columns += int(present.sum())
+
+        codes = np.column_stack(codes) if codes else np.zeros((len(csv.index), 0), dtype=np.int32)
+        present = codes >= 0
+        indptr = np.r_[0, np.cumsum(present.sum(axis=1))]
+        binary = sparse.csr_matrix((np.ones(indptr[-1], dtype=np.int32), codes[present], indptr), shape=(len(csv.index), num_columns))
+        return binary, names
+
+    def binarize_data(self, csv, encoded = None):
+        # Convert categorical values into those representable by either a zero or a one (see encode_categories)
+        # The row label is followed by the new columns, allocated at once as a single block of uint8 values
+        binary, names = self.encode_categories(csv) if encoded is None else encoded
+        values = np.zeros(binary.shape, dtype=np.uint8)
+        values[np.repeat(np.arange(binary.shape[0]), np.diff(binary.indptr)), binary.indices] = 1
+        return pd.concat([csv.iloc[:, :1], pd.DataFrame(values, index=csv.index, columns=names)], axis=1)
 
     def get_jaccard_similarity(self, index_1, index_2):
         # Calculates |A ⋂ B | / | A ⋃ B | or cardinality of the intersection of A & B over the union of A & B
@@ -74,50 +286,266 @@ class ROCK:
                 different += 1.0
         return similar / (similar + different)
 
-    def create_adjacency_matrix(self):
-        # This naive approach is very costly and grows quickly in execution time relative to input
-        # Consider implementing compute_link procedure from fig. 4 of ROCK paper?
-
-        # generate initial adjacency matrix, with all values set to 0
-        matrix = np.zeros((self.__data_size,self.__data_size))
-        for i in trange(0, self.__data_size,desc="Creating adjacency matrix"):
-            for j in range(i + 1, self.__data_size):
-                similarity = self.get_jaccard_similarity(i,j)
-                # if data points i and j have a similarity greater than the
-                # threshold, set corresponding matrix values to 1
-                if (similarity >= self.__threshold):
-                    matrix[i][j] = 1
-                    matrix[j][i] = 1
-        return matrix
-
-    def compute_link(self):
-        # create adjacency matrix
-        adj = self.create_adjacency_matrix()
-        # square it
-        link = np.dot(adj,adj)
+    def get_binary_matrix(self):
+        # Sparse matrix with a 1 wherever a data point (row) has the value 1 for an attribute (column), ignoring the row label
+        # Only values equal to 1 count towards similarity, as in get_jaccard_similarity
+        # The matrix is kept once built, as reporting on clusters uses it too
+        if self.__binary is None:
+            self.__binary = sparse.csr_matrix(self.__data.iloc[:, 1:].to_numpy() == 1, dtype=np.int32)
+        return self.__binary
+
+    def get_label_codes(self):
+        # Number of the label of each row, equal for rows with equal labels
+        # Rows with no attributes at all are identical (similarity 1.0) exactly when their labels are equal, and otherwise
+        # have a similarity of 0, as neither |A ⋂ B| nor |A ⋃ B| has any elements
+        if self.__label_codes is None:
+            self.__label_codes = pd.factorize(self.__data.iloc[:, 0], use_na_sentinel=False)[0]
+        return self.__label_codes
+
+    def create_adjacency_matrix(self, block_size = None):
+        # The adjacency matrix is returned in sparse (CSR) form, i.e. as the list of neighbours of each point
+        return get_adjacency(self.create_similarity_matrix(block_size))
+
+    def create_similarity_matrix(self, block_size = None):
+        # Jaccard similarities are computed a block of rows at a time with sparse matrix products:
+        # |A ⋂ B| is the product of the binary matrix with its transpose, and |A ⋃ B| = |A| + |B| - |A ⋂ B|
+        # This gives the same neighbours as calling get_jaccard_similarity on every pair of data points
+        # The similarities of neighbours are returned in sparse (CSR) form
+
+        # Each block holds several arrays of similarities between its rows & every point
+        if block_size is None:
+            block_size = 1024 if self.__memory_budget is None else int(min(1024, max(1, self.__memory_budget // (40 * self.__data_size))))
+
+        binary = self.get_binary_matrix()
+        binary_t = binary.T.tocsc()
+        row_sizes = np.asarray(binary.sum(axis=1)).ravel()
+        label_codes = self.get_label_codes()
+
+        rows, columns, values = [], [], []
+        for start in trange(0, self.__data_size, block_size, desc="Creating adjacency matrix"):
+            end = min(start + block_size, self.__data_size)
+            intersection = (binary[start:end] @ binary_t).toarray()
+            union = row_sizes[start:end, None] + row_sizes[None, :] - intersection
+            with np.errstate(divide='ignore', invalid='ignore'):
+                similarity = intersection / union
+
+            # Pairs of points with no attributes at all are only similar if the two rows are identical (see get_label_codes)
+            empty_rows, empty_columns = np.nonzero(union == 0)
+            similarity[empty_rows, empty_columns] = label_codes[start + empty_rows] == label_codes[empty_columns]
+
+            # data points i and j are neighbours if they have a similarity greater than the threshold
+            similarity[np.arange(end - start), np.arange(start, end)] = 0
+            block_rows, block_columns = np.nonzero(similarity >= self.__threshold)
+            rows.append(block_rows + start)
+            columns.append(block_columns)
+            values.append(similarity[block_rows, block_columns])
+
+        rows, columns, values = np.concatenate(rows), np.concatenate(columns), np.concatenate(values)
+        return sparse.csr_matrix((values, (rows, columns)), shape=(self.__data_size, self.__data_size))
+
+    def get_minhash_signatures(self, binary, hashes_per_block = 16):
+        # The MinHash signature of a data point is, for each of num_hashes random hash functions, the smallest hash of any attribute it has
+        # The probability that two points have the same value in one position of their signatures is their Jaccard similarity
+        # Returns signatures for points with at least one attribute only, in the order of those points
+        prime = (1 << 31) - 1
+        rng = np.random.default_rng(self.__seed)
+        a = rng.integers(1, prime, size=self.__num_hashes, dtype=np.int64)
+        b = rng.integers(0, prime, size=self.__num_hashes, dtype=np.int64)
+
+        non_empty = np.flatnonzero(np.diff(binary.indptr))
+        attributes = binary.indices.astype(np.int64)[:, None]
+        signatures = np.empty((len(non_empty), self.__num_hashes), dtype=np.int64)
+        for start in range(0, self.__num_hashes, hashes_per_block):
+            end = min(start + hashes_per_block, self.__num_hashes)
+            hashes = (attributes * a[start:end] + b[start:end]) % prime
+            signatures[:, start:end] = np.minimum.reduceat(hashes, binary.indptr[non_empty], axis=0)
+        return signatures
+
+    def get_lsh_bands(self):
+        # Signatures are split into bands of r rows. Two points become a candidate pair if all r rows of any band are equal,
+        # which for points with similarity s happens with probability 1 - (1 - s^r)^b, where b is the number of bands
+        # The longest bands (fewest candidates) that still find a pair of points exactly at the threshold with probability
+        # lsh_recall are used, so more similar pairs are found with a higher probability still
+        for rows in range(self.__num_hashes, 0, -1):
+            bands = self.__num_hashes // rows
+            if 1.0 - (1.0 - self.__threshold ** rows) ** bands >= self.__lsh_recall:
+                return bands, rows
+        return self.__num_hashes, 1
+
+    def create_approximate_adjacency_matrix(self, pairs_per_block = 1000000):
+        return get_adjacency(self.create_approximate_similarity_matrix(pairs_per_block))
+
+    def create_approximate_similarity_matrix(self, pairs_per_block = 1000000):
+        # Neighbours are found among candidate pairs of points with equal MinHash signatures in at least one band
+        # The similarity of each candidate pair is then calculated exactly, so every pair found is a true neighbour
+        # but some neighbours may be missed (see get_neighbour_recall). Raising num_hashes or lsh_recall finds more
+        # neighbours at the cost of checking more candidates
+
+        binary = self.get_binary_matrix()
+        row_sizes = np.asarray(binary.sum(axis=1)).ravel()
+        non_empty = np.flatnonzero(row_sizes)
+        signatures = self.get_minhash_signatures(binary)
+        bands, rows = self.get_lsh_bands()
+
+        rng = np.random.default_rng(self.__seed)
+        multipliers = rng.integers(1, 1 << 62, size=rows, dtype=np.int64).astype(np.uint64)
+        candidates = []
+        for band in trange(bands, desc="Finding candidate pairs"):
+            # points are grouped by a hash of the rows of their signature in this band
+            keys = (signatures[:, band * rows:(band + 1) * rows].astype(np.uint64) * multipliers).sum(axis=1)
+            # every point is paired with the other points in the same group
+            first, second = get_pairs_with_equal_keys(keys)
+            candidates.append(non_empty[first] * self.__data_size + non_empty[second])
+        candidates = np.unique(np.concatenate(candidates)) if candidates else np.zeros(0, dtype=np.int64)
+
+        # Points with no attributes at all have no signature, they are only similar to identical rows, i.e. those with
+        # the same label (see get_label_codes)
+        empty = np.flatnonzero(row_sizes == 0)
+        empty_first, empty_second = get_pairs_with_equal_keys(self.get_label_codes()[empty])
+
+        rows_found, columns_found, values_found = [], [], []
+        for start in trange(0, len(candidates), pairs_per_block, desc="Checking candidate pairs"):
+            block = candidates[start:start + pairs_per_block]
+            point_1, point_2 = block // self.__data_size, block % self.__data_size
+            intersection = np.asarray(binary[point_1].multiply(binary[point_2]).sum(axis=1)).ravel()
+            similarity = intersection / (row_sizes[point_1] + row_sizes[point_2] - intersection)
+            similar = similarity >= self.__threshold
+            rows_found.append(point_1[similar])
+            columns_found.append(point_2[similar])
+            values_found.append(similarity[similar])
+        rows_found.append(empty[empty_first])
+        columns_found.append(empty[empty_second])
+        values_found.append(np.ones(len(empty_first), dtype=np.float64))
+
+        rows_found, columns_found, values_found = np.concatenate(rows_found), np.concatenate(columns_found), np.concatenate(values_found)
+        similarity = sparse.csr_matrix((values_found, (rows_found, columns_found)), shape=(self.__data_size, self.__data_size))
+        # each pair was found once, as (i, j) with i < j
+        return (similarity + similarity.T).tocsr()
+
+    def get_neighbour_recall(self):
+        # Fraction of the neighbours found by create_adjacency_matrix that are also found by create_approximate_adjacency_matrix
+        exact = self.create_adjacency_matrix()
+        approximate = self.create_approximate_adjacency_matrix()
+        if exact.nnz == 0:
+            return 1.0
+        return exact.multiply(approximate).nnz / exact.nnz
+
+    def create_neighbour_matrix(self, similarity = False):
+        # Sparse adjacency matrix, found exactly or approximately, or the similarities of neighbours if similarity is True
+        if similarity:
+            return self.create_approximate_similarity_matrix() if self.__approximate else self.create_similarity_matrix()
+        if self.__approximate:
+            return self.create_approximate_adjacency_matrix()
+        return self.create_adjacency_matrix()
+
+    def compute_link(self, adj = None):
+        # compute_link procedure from fig. 4 of ROCK paper: the number of links between points i and j is the number of
+        # neighbours they share, so links are only counted through each point's list of neighbours rather than by squaring
+        # a dense adjacency matrix. The sparse product below does exactly this, in time proportional to the sum of
+        # squared neighbour counts
+        if adj is None:
+            adj = self.create_neighbour_matrix()
+        link = remove_self_links((adj @ adj).tocsr())
+
         # return completed link matrix
         return link
 
+    def get_link_bounds(self, adj):
+        # The sum of all links (i.e. of link matrix entries) & an upper bound on the number of non-zero links of each point,
+        # found from the adjacency matrix without computing the link matrix
+        degrees = np.diff(adj.indptr).astype(np.int64)
+        total_links = int((degrees * degrees).sum() - degrees.sum())
+        row_bounds = np.minimum(adj @ degrees, self.__data_size - 1)
+        return total_links, row_bounds
+
+    def use_memmap_link_store(self, adj):
+        # With link_store 'auto', the link matrix is kept on disk if the link matrix, the smallest in memory link store &
+        # the local heaps would not fit within the memory budget (each non-zero link of a sparse matrix takes 12 bytes)
+        # The local heaps hold an entry for every non-zero link (both (i, j) & (j, i)) & always stay in memory, so they count
+        # against the budget whichever store is used. If they alone exceed it, clustering will use more memory than the budget
+        if self.__link_store == 'memmap':
+            return True
+        if self.__link_store != 'auto' or self.__memory_budget is None:
+            return False
+        total_links, row_bounds = self.get_link_bounds(adj)
+        num_links = int(row_bounds.sum())
+        store_bytes = min(get_dense_memory_usage(self.__data_size, total_links), num_links * SPARSE_BYTES_PER_LINK)
+        heap_bytes = num_links * HEAP_BYTES_PER_ENTRY
+        if heap_bytes > self.__memory_budget:
+            print(f"The local heaps alone need about {heap_bytes} bytes, more than the memory budget of {self.__memory_budget} bytes.")
+        return 12 * num_links + store_bytes + heap_bytes > self.__memory_budget
+
+    def get_link_blocks(self, adj, link_store = None):
+        # Generator computing the link matrix a block of rows at a time, each yielded as (first row, last row + 1, sparse link matrix)
+        # Blocks are sized so that their non-zero links fit within a quarter of the memory budget. If a link store is given,
+        # each block is added to it as it is computed
+        total_links, row_bounds = self.get_link_bounds(adj)
+        max_links = max(1, (self.__memory_budget or 1 << 30) // (4 * 12))
+        cumulative_bounds = np.r_[0, np.cumsum(row_bounds)]
+        start = 0
+        while start < self.__data_size:
+            end = int(np.searchsorted(cumulative_bounds, cumulative_bounds[start] + max_links, side='right')) - 1
+            end = min(max(end, start + 1), self.__data_size)
+            link = (adj[start:end] @ adj).tocoo()
+            # a point's links with itself are never used
+            keep = (link.row + start != link.col) & (link.data != 0)
+            link = sparse.csr_matrix((link.data[keep], (link.row[keep], link.col[keep])), shape=(end - start, self.__data_size))
+            if link_store is not None:
+                link_store.add_links(start, link)
+            yield start, end, link
+            start = end
+
+    def get_row_blocks(self, link, block_size = 4096):
+        # Generator yielding blocks of rows of a link matrix already in memory, in the same form as get_link_blocks
+        for start in range(0, self.__data_size, block_size):
+            end = min(start + block_size, self.__data_size)
+            yield start, end, link[start:end]
+
     def get_goodness(self, cluster_i , cluster_j):
         # The 'goodness measure' is a criterion function for determining which clusters should be merged
         # The higher the value of the criterion function, the better the two candidate clusters are for merging
         # The goodness measure is determined by dividing the number of cross links between two clusters by the expected number of cross links
 
-        num_cross_links = self.__link[cluster_i][cluster_j]
+        num_cross_links = self.__link.get(cluster_i, cluster_j)
 
         # n_i and n_j represent the number of points in cluster_i and cluster_j respectively
         n_i = len(self.__clusters[cluster_i])
         n_j = len(self.__clusters[cluster_j])
 
-        expected_links_ni_nj = (n_i + n_j) ** self.__expected_links_exponent
-        expected_links_ni = n_i ** self.__expected_links_exponent
-        expected_links_nj = n_j ** self.__expected_links_exponent
+        expected_links_ni_nj = float(self.__expected_links[n_i + n_j])
+        expected_links_ni = float(self.__expected_links[n_i])
+        expected_links_nj = float(self.__expected_links[n_j])
 
         expected_num_cross_links = expected_links_ni_nj - expected_links_ni - expected_links_nj
 
         return (num_cross_links / expected_num_cross_links)
 
-    def build_local_heaps(self):
+    def get_expected_cross_links(self, n_i, n_j):
+        # Expected number of cross links between clusters of sizes n_i & n_j, for arrays of sizes
+        return self.__expected_links[n_i + n_j] - self.__expected_links[n_i] - self.__expected_links[n_j]
+
+    def get_goodness_rows(self, link, sizes, start):
+        # Goodness measures between the clusters in a block of rows of a sparse link matrix, starting at row start, & every cluster
+        # they have links with, calculated for all of those links at once. sizes holds the number of points in each cluster (0 if it is not a cluster)
+        # Returns the goodness measures, the clusters they refer to & the offset of each row's measures within them
+        num_rows = link.shape[0]
+        rows = np.repeat(np.arange(start, start + num_rows), np.diff(link.indptr))
+        columns = link.indices
+        n_i, n_j = sizes[rows], sizes[columns]
+        clusters = (n_i > 0) & (n_j > 0)
+        rows, columns, n_i, n_j = rows[clusters], columns[clusters], n_i[clusters], n_j[clusters]
+
+        goodness = link.data[clusters] / self.get_expected_cross_links(n_i, n_j)
+
+        # Sort each row's measures from highest to lowest, so they can be used as a heap as they are
+        order = np.lexsort((-columns, -goodness, rows))
+        goodness, columns, rows = goodness[order], columns[order], rows[order]
+
+        offsets = np.zeros(num_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows - start, minlength=num_rows), out=offsets[1:])
+        return goodness, columns, offsets
+
+    def build_local_heaps(self, link_blocks, num_threads = 4):
         # Each cluster in the dataset has a local heap
         # The contents of each local heap for arbitrary cluster c_i is a reference to every other cluster c_j
         # such that the number of links between them is non-zero.
@@ -125,19 +553,32 @@ class ROCK:
         # and the second element is a reference to cluster c_j
         # The contents of each local heap is ordered by the goodness measures from highest to lowest
 
+        # Goodness measures are calculated a block of rows of the link matrix at a time (see get_link_blocks & get_row_blocks),
+        # with each group of num_threads blocks shared between threads
+        # Local heaps are indexed by cluster, so the entry for any cluster can be updated or removed without searching the heap
+        sizes = np.zeros(self.__data_size, dtype=np.int64)
+        for i in self.__clusters:
+            sizes[i] = len(self.__clusters[i])
+
         heaps = {}
         pbar = tqdm(total=len(self.__clusters),desc="Building local heaps")
-        for i in list(self.__clusters):
-            pbar.update(1)
-            heaps[i] = []
-            for j in self.__clusters:
-                if i != j and self.__link[i][j] > 0:
-                    heaps[i].append((self.get_goodness(i,j),j))
-            if len(heaps[i]) == 0:
-                del self.__clusters[i]
-                del heaps[i]
-            else:
-                hmax.heapify_max(heaps[i])
+        with ThreadPoolExecutor(num_threads) as executor:
+            while True:
+                blocks = list(islice(link_blocks, num_threads))
+                if len(blocks) == 0:
+                    break
+                block_goodness = executor.map(lambda block: self.get_goodness_rows(block[2], sizes, block[0]), blocks)
+                for (start, end, link), (goodness, columns, offsets) in zip(blocks, block_goodness):
+                    entries = list(zip(goodness.tolist(), columns.tolist()))
+                    offsets = offsets.tolist()
+                    for i in range(start, end):
+                        if i not in self.__clusters:
+                            continue
+                        pbar.update(1)
+                        if offsets[i - start] == offsets[i - start + 1]:
+                            del self.__clusters[i]
+                        else:
+                            heaps[i] = indexed_max_heap(entries[offsets[i - start]:offsets[i - start + 1]], ordered=True)
         pbar.close()
         return heaps
 
@@ -146,10 +587,16 @@ class ROCK:
         # it is ordered in the same way as local heaps, by goodness measure from highest to lowest
         # Thus, at any given time the maximal element of the global heap and the first element of the local heap it references
         # represent the two best clusters to merge at any given step of the algorithm
+        # Each entry is keyed by the cluster whose local heap it came from, so it can be updated as that local heap changes
+
+        return indexed_max_heap((self.__local_heaps[i].peek(),i) for i in self.__local_heaps)
 
-        heap = [(self.__local_heaps[i][0],i) for i in self.__local_heaps]
-        hmax.heapify_max(heap)
-        return heap
+    def update_global_heap(self, cluster):
+        # Replace the entry of cluster in the global heap with the new maximal element of its local heap
+        if cluster in self.__local_heaps:
+            self.__global_heap.push(cluster, self.__local_heaps[cluster].peek())
+        else:
+            self.__global_heap.remove(cluster)
 
     def merge_clusters(self,cluster_i,cluster_j):
         # To merge clusters, the lists of elements in cluster_j are added to cluster_i
@@ -163,122 +610,325 @@ class ROCK:
             if len(self.__clusters[cluster]) <= size_threshold:
                 del self.__clusters[cluster]
 
-    def cluster(self):
-        # Create squared adjacency matrix from data
-        self.__link = self.compute_link()
+    def cluster(self, checkpoint_path = None, checkpoint_interval = None, checkpoint_seconds = None, link = None):
+        # Create squared adjacency matrix from data, unless a link matrix is given (see sweep_thresholds)
+        # If it would not fit in memory, it is computed a block at a time & written to a file as the local heaps are built
+        adj = self.create_neighbour_matrix() if link is None else None
+        if adj is not None and self.use_memmap_link_store(adj):
+            total_links, row_bounds = self.get_link_bounds(adj)
+            self.__link = dense_link_store(self.__data_size, total_links, create_link_file(self.__link_directory))
+            link_blocks = self.get_link_blocks(adj, self.__link)
+        else:
+            if link is None:
+                link = self.compute_link(adj)
+            self.__link = create_link_store(link, self.__link_store, self.__link_directory)
+            link_blocks = self.get_row_blocks(link)
 
         # Create initial local and global heaps
-        self.__local_heaps = self.build_local_heaps()
+        self.__local_heaps = self.build_local_heaps(link_blocks)
         self.__global_heap = self.build_global_heap()
-
+        self.__cluster_sizes = np.zeros(self.__data_size, dtype=np.int64)
+        for i in self.__clusters:
+            self.__cluster_sizes[i] = len(self.__clusters[i])
+        self.__num_merges = 0
+        self.__merge_history = []
+        self.__initial_clusters = sorted(self.__clusters)
+        self.__link_snapshot = None
+
+        self.merge_until_done(checkpoint_path, checkpoint_interval, checkpoint_seconds)
+
+    def resume(self, checkpoint_path, checkpoint_interval = None, checkpoint_seconds = None):
+        # Continue clustering from a checkpoint saved by cluster (or resume) on an instance created with the same arguments
+        # Further checkpoints are saved to the same file
+        self.load_checkpoint(checkpoint_path)
+        self.merge_until_done(checkpoint_path, checkpoint_interval, checkpoint_seconds)
+
+    def merge_until_done(self, checkpoint_path = None, checkpoint_interval = None, checkpoint_seconds = None):
+        # If a checkpoint path is given, the state of clustering is saved there every checkpoint_interval merges and/or
+        # every checkpoint_seconds seconds
+        last_checkpoint = time.time()
         pbar = tqdm(total=len(self.__clusters)-self.__desired_num_clusters,desc="Computing clusters:")
 
         # Continually merge clusters until desired number of clusters reached or the global heap is empty
         while len(self.__clusters) > self.__desired_num_clusters and len(self.__global_heap) != 0:
-
             # Extract best candidate clusters (i and j) for merging from the global heap
-            best_clusters = hmax.heappop_max(self.__global_heap)
+            best_clusters = self.__global_heap.peek()
             cluster_i = best_clusters[1]
             cluster_j = best_clusters[0][1]
 
-            # Delete cluster_j from the global heap as it is being merged into cluster_i
-            for i in range(len(self.__global_heap)):
-                if self.__global_heap[i][1] == cluster_j:
-                    del self.__global_heap[i]
-                    hmax.heapify_max(self.__global_heap)
-                    break
-
             # Merge clusters i and j
             self.__clusters[cluster_i] = self.merge_clusters(cluster_i, cluster_j)
-
+            self.__cluster_sizes[cluster_i] += self.__cluster_sizes[cluster_j]
+            self.__cluster_sizes[cluster_j] = 0
+            self.__merge_history.append((cluster_i, cluster_j, best_clusters[0][0], int(self.__cluster_sizes[cluster_i])))
 
             # to_update = all points in local heaps of cluster_i & cluster_j
-            points_in_cluster_i = set([y[1] for y in self.__local_heaps[cluster_i]]) - set([cluster_j])
-            points_in_cluster_j = set([z[1] for z in self.__local_heaps[cluster_j]]) - set([cluster_i])
-            to_update =  list(points_in_cluster_i | points_in_cluster_j)
-
-            # empty local heap of cluster_i ready for reconstruction
-            self.__local_heaps[cluster_i] = []
-
-            # for each cluster_x in the union of local heaps for clusters i and j
-            for cluster_x in to_update:
-                # update link between cluster_x and cluster_i to be link[cluster_x][cluster_i] + link[cluster_x][cluster_j]
-                self.__link[cluster_x][cluster_i] = self.__link[cluster_x][cluster_i] + self.__link[cluster_x][cluster_j]
-
-                # delete clusters i and j from the local heap of cluster_x
-                try:
-                    for i in range(len(self.__local_heaps[cluster_x])):
-                        if self.__local_heaps[cluster_x][i][1] == cluster_i:
-                            del self.__local_heaps[cluster_x][i]
-                            hmax.heapify_max(self.__local_heaps[cluster_x])
-                            break
-                    for i in range(len(self.__local_heaps[cluster_x])):
-                        if self.__local_heaps[cluster_x][i][1] == cluster_j:
-                            del self.__local_heaps[cluster_x][i]
-                            hmax.heapify_max(self.__local_heaps[cluster_x])
-                            break
-
-                    # update local heap for cluster x with new entry for cluster_i
-                    # update local heap for cluster_i with new entry for cluster_x
-                    hmax.heappush_max(self.__local_heaps[cluster_x], (self.get_goodness(cluster_i, cluster_x), cluster_i))
-                    hmax.heappush_max(self.__local_heaps[cluster_i], (self.get_goodness(cluster_i, cluster_x), cluster_x))
-                except KeyError as e:
-                    # | operator for set difference makes this uneccessary...
-                    print(f'{x}: Outlier?')
+            points_in_cluster_i = set(self.__local_heaps[cluster_i].keys()) - set([cluster_j])
+            points_in_cluster_j = set(self.__local_heaps[cluster_j].keys()) - set([cluster_i])
+            # (in order, so that a link store on disk is read in order)
+            to_update =  sorted(points_in_cluster_i | points_in_cluster_j)
+
+            # fold row & column j of the link matrix into row & column i: for every cluster_x in the union of local heaps
+            # for clusters i and j, link[cluster_i][cluster_x] = link[cluster_x][cluster_i] = link[cluster_i][cluster_x] + link[cluster_j][cluster_x]
+            # and calculate the goodness measures of all of the new links at once
+            links = self.__link.get_links(cluster_i, to_update) + self.__link.get_links(cluster_j, to_update)
+            goodness = links / self.get_expected_cross_links(self.__cluster_sizes[cluster_i], self.__cluster_sizes[to_update])
+            self.__link.merge(cluster_i, cluster_j, to_update, links)
+
+            # rebuild local heap of cluster_i from the new goodness measures
+            goodness = goodness.tolist()
+            self.__local_heaps[cluster_i] = indexed_max_heap(zip(goodness, to_update))
+
+            for cluster_x, goodness_x in zip(to_update, goodness):
+                # delete cluster j from the local heap of cluster_x
+                # update local heap for cluster x with new entry for cluster_i
+                self.__local_heaps[cluster_x].remove(cluster_j)
+                self.__local_heaps[cluster_x].push(cluster_i, goodness_x)
+                self.update_global_heap(cluster_x)
 
             # delete local heap for cluster_j
             del self.__local_heaps[cluster_j]
+            self.__global_heap.remove(cluster_j)
 
             # Q_update(u)
             # if local heap for cluster_i is now empty, delete it from local heaps
-            if self.__local_heaps[cluster_i] == []:
+            if len(self.__local_heaps[cluster_i]) == 0:
                 del self.__local_heaps[cluster_i]
-            # rebuild global heap based on updated local heaps
-            self.__global_heap = self.build_global_heap()
+            self.update_global_heap(cluster_i)
+            self.__num_merges += 1
             pbar.update(1)
+
+            if checkpoint_path is not None:
+                if (checkpoint_interval and self.__num_merges % checkpoint_interval == 0) or (checkpoint_seconds and time.time() - last_checkpoint >= checkpoint_seconds):
+                    self.save_checkpoint(checkpoint_path)
+                    last_checkpoint = time.time()
         pbar.close()
 
-    def get_cluster_info(self):
-        # Create output string for discovered clusters
-        output = ""
-        cluster_count = 1
-        if self.__classified == True:
-            labels = self.__data[self.__data.columns.tolist()[0]].unique().tolist()
-            for i in self.__clusters:
-                label_counts = {}
-                labels_in_cluster = [self.__data.iloc[x].tolist()[0] for x in self.__clusters[i]]
-                for label in labels:
-                    label_counts[label] = labels_in_cluster.count(label)
-                output +=  ("Cluster " + str(cluster_count) + ": ")
-                for j in label_counts:
-                    output += (str(label_counts[j]) + " " + str(j) + ", ")
-                output += "\b\b.\n"
-                cluster_count += 1
+        # Links are no longer needed once clustering is complete, remove a link store kept on disk
+        self.__link.close()
+
+    def save_checkpoint(self, checkpoint_path):
+        # Save the state of clustering part way through merging, so that it can be continued by resume
+        # Local heaps are saved as arrays of their entries (in heap order) and links as a sparse matrix, so saving & loading
+        # is dominated by copying arrays rather than pickling Python objects. The file is replaced only once fully written
+        # The links of a store kept on disk are not read into memory: its file is copied next to the checkpoint (a new copy
+        # for every checkpoint, as the store keeps changing), & the copy of the previous checkpoint is removed once the new one is saved
+        heap_clusters = list(self.__local_heaps)
+        heap_entries = [self.__local_heaps[i].entries() for i in heap_clusters]
+        state = {
+            'data_size': self.__data_size,
+            'threshold': self.__threshold,
+            'num_merges': self.__num_merges,
+            'merge_history': self.__merge_history,
+            'initial_clusters': self.__initial_clusters,
+            'clusters': self.__clusters,
+            'cluster_sizes': self.__cluster_sizes,
+            'link_store': self.__link.get_kind(),
+            'heap_clusters': np.array(heap_clusters, dtype=np.int64),
+            'heap_offsets': np.cumsum([0] + [len(entries) for entries in heap_entries]),
+            'heap_goodness': np.array([goodness for entries in heap_entries for goodness, cluster in entries], dtype=np.float64),
+            'heap_keys': np.array([cluster for entries in heap_entries for goodness, cluster in entries], dtype=np.int64)}
+        if state['link_store'] == 'memmap':
+            file_descriptor, state['link_snapshot'] = tempfile.mkstemp(prefix=os.path.basename(checkpoint_path) + '.', suffix='.link', dir=os.path.dirname(os.path.abspath(checkpoint_path)))
+            os.close(file_descriptor)
+            state['link_state'] = self.__link.snapshot(state['link_snapshot'])
+        else:
+            state['link'] = self.__link.get_link_matrix()
+        with open(checkpoint_path + '.tmp', 'wb') as checkpoint_file:
+            pickle.dump(state, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(checkpoint_path + '.tmp', checkpoint_path)
+        if self.__link_snapshot is not None and os.path.isfile(self.__link_snapshot):
+            os.remove(self.__link_snapshot)
+        self.__link_snapshot = state.get('link_snapshot')
+
+    def load_checkpoint(self, checkpoint_path):
+        # Restore the state of clustering saved by save_checkpoint
+        if not os.path.isfile(checkpoint_path):
+            raise FileNotFoundError(f"Checkpoint {checkpoint_path} not found.")
+        with open(checkpoint_path, 'rb') as checkpoint_file:
+            state = pickle.load(checkpoint_file)
+        if state['data_size'] != self.__data_size or state['threshold'] != self.__threshold:
+            raise ValueError(f"Checkpoint {checkpoint_path} was saved for a different dataset or threshold.")
+
+        self.__num_merges = state['num_merges']
+        self.__merge_history = state['merge_history']
+        self.__initial_clusters = state['initial_clusters']
+        self.__clusters = state['clusters']
+        self.__cluster_sizes = state['cluster_sizes']
+        if state['link_store'] == 'memmap':
+            if not os.path.isfile(state['link_snapshot']):
+                raise FileNotFoundError(f"Links of checkpoint {checkpoint_path} not found at {state['link_snapshot']}.")
+            self.__link = open_link_snapshot(state['link_snapshot'], state['link_state'], self.__link_directory)
         else:
-            for i in self.__clusters :
-                labels_in_cluster = [self.__data.iloc[x].tolist()[0] for x in self.__clusters[i]]
-                output += ("Cluster " + str(cluster_count) + ":\n")
-                for label in labels_in_cluster:
-                    output += ("\t" + label + "\n")
-                cluster_count += 1
-        return output
-
-    def get_cluster_detail(self, cluster):
-        # Retrieve authors present in cluster + how many times they appear
-        authors = {}
-        cluster = list(self.__clusters.keys())[cluster-1]
-        for conf in self.__clusters[cluster]:
-            for i in range(0,len(self.__data.iloc[conf])):
-                if self.__data.iloc[conf][i] == 1:
-                    try:
-                        authors[self.__data.columns.values[i]] += 1
-                    except:
-                        authors[self.__data.columns.values[i]] = 1
-
-        authors = sorted(authors.items(), key = lambda x: x[1], reverse = True)
-        authors = OrderedDict(authors)
-
-        return authors
+            self.__link = create_link_store(state['link'], state['link_store'], self.__link_directory, sorted(self.__clusters))
+        self.__link_snapshot = state.get('link_snapshot')
+
+        offsets, goodness, keys = state['heap_offsets'].tolist(), state['heap_goodness'].tolist(), state['heap_keys'].tolist()
+        self.__local_heaps = {}
+        for number, i in enumerate(state['heap_clusters'].tolist()):
+            self.__local_heaps[i] = indexed_max_heap(zip(goodness[offsets[number]:offsets[number + 1]], keys[offsets[number]:offsets[number + 1]]), ordered=True)
+        self.__global_heap = self.build_global_heap()
+
+    def get_merge_history(self):
+        # Every merge made by cluster, in order, as a dataframe of the two clusters merged (the merged cluster keeps the id of
+        # cluster_i), the goodness measure between them & the size of the merged cluster
+        return pd.DataFrame(self.__merge_history, columns=['cluster_i', 'cluster_j', 'goodness', 'size'])
+
+    def cut(self, num_clusters = None, min_goodness = None):
+        # Replace the clusters with those there were after fewer merges, without clustering again: when there were num_clusters
+        # clusters, and/or before the first merge of clusters whose goodness measure was below min_goodness
+        # Clustering once with num_clusters = 1 gives a merge history that can be cut at any number of clusters
+        # Merges are replayed in O(n), with each cluster kept as a linked list of its points, so the clusters (& the order of
+        # their points) are the same as if clustering had stopped there
+        num_merges = len(self.__merge_history)
+        if num_clusters is not None:
+            num_merges = min(num_merges, max(len(self.__initial_clusters) - int(num_clusters), 0))
+        if min_goodness is not None:
+            below = [number for number, merge in enumerate(self.__merge_history[:num_merges]) if merge[2] < min_goodness]
+            if len(below) > 0:
+                num_merges = below[0]
+
+        next_point = np.full(self.__data_size, -1, dtype=np.int64)
+        last_point = np.arange(self.__data_size, dtype=np.int64)
+        merged = np.zeros(self.__data_size, dtype=bool)
+        for cluster_i, cluster_j, goodness, size in self.__merge_history[:num_merges]:
+            next_point[last_point[cluster_i]] = cluster_j
+            last_point[cluster_i] = last_point[cluster_j]
+            merged[cluster_j] = True
+
+        next_point = next_point.tolist()
+        self.__clusters = {}
+        for i in self.__initial_clusters:
+            if not merged[i]:
+                points = [i]
+                while next_point[points[-1]] != -1:
+                    points.append(next_point[points[-1]])
+                self.__clusters[i] = points
+        return self.__clusters
+
+    def label_remaining_data(self, chunk_size = 1000, representative_fraction = 1.0):
+        # Labelling on disk from section 4 of the ROCK paper: once a sample has been clustered, each remaining row of the csv file
+        # is read in chunks and assigned to the cluster in which it has the most neighbours, normalised by the expected number of
+        # neighbours (|L_i| + 1) ^ f(θ), where L_i is a set of representative points chosen from cluster i
+        # Rows with no neighbours in any cluster are left unassigned as outliers
+        # Returns the cluster of every row in the csv file (-1 for outliers), in the order of the file
+        if self.__sample_rows is None:
+            print("No sample was taken, every row has already been clustered.")
+            return None
+        if len(self.__clusters) == 0:
+            print("No clusters were found in the sample.")
+            return None
+
+        # Choose representatives from each cluster and find the sizes of their rows
+        rng = np.random.default_rng(self.__seed)
+        cluster_ids = list(self.__clusters)
+        representatives, representative_clusters = [], []
+        for number, i in enumerate(cluster_ids):
+            points = self.__clusters[i]
+            num_representatives = max(1, int(round(representative_fraction * len(points))))
+            representatives.extend(rng.choice(points, size=num_representatives, replace=False).tolist())
+            representative_clusters.extend([number] * num_representatives)
+        binary = self.get_binary_matrix()[representatives]
+        binary_t = binary.T.tocsc()
+        representative_sizes = np.asarray(binary.sum(axis=1)).ravel()
+        membership = sparse.csr_matrix((np.ones(len(representatives)), (np.arange(len(representatives)), representative_clusters)), shape=(len(representatives), len(cluster_ids)))
+        expected_neighbours = (np.bincount(representative_clusters, minlength=len(cluster_ids)) + 1.0) ** ((1.0 - self.__threshold) / (1.0 + self.__threshold))
+        columns = self.__data.columns[1:]
+
+        # Points in the sample keep the cluster they were given
+        num_rows = self.count_rows()
+        self.__assignments = np.full(num_rows, -1, dtype=np.int64)
+        cluster_of_point = {point: i for i in self.__clusters for point in self.__clusters[i]}
+        for point, row in enumerate(self.__sample_rows):
+            self.__assignments[row] = cluster_of_point.get(point, -1)
+        self.__row_labels = [None] * num_rows
+
+        sampled = np.zeros(num_rows, dtype=bool)
+        sampled[self.__sample_rows] = True
+        first_row = 0
+        for chunk in tqdm(self.read_chunks(chunk_size), total=-(-num_rows // chunk_size), desc="Labelling remaining data"):
+            rows = np.arange(first_row, first_row + len(chunk.index))
+            first_row += len(chunk.index)
+            for row, label in zip(rows, chunk.iloc[:, 0].tolist()):
+                self.__row_labels[row] = label
+            chunk = chunk[~sampled[rows]]
+            rows = rows[~sampled[rows]]
+            if len(rows) == 0:
+                continue
+            # A row's size counts all of its attributes, including any the sample does not have
+            if self.__binarize == True:
+                chunk_binary, chunk_columns = self.encode_categories(chunk)
+                row_sizes = np.diff(chunk_binary.indptr)
+                chunk_binary = chunk_binary.tocoo()
+                positions = columns.get_indexer(chunk_columns)[chunk_binary.col]
+                in_sample = positions >= 0
+                chunk_binary = sparse.csr_matrix((chunk_binary.data[in_sample], (chunk_binary.row[in_sample], positions[in_sample])), shape=(len(rows), len(columns)))
+            else:
+                chunk_values = chunk.iloc[:, 1:]
+                row_sizes = (chunk_values.to_numpy() == 1).sum(axis=1)
+                chunk_binary = sparse.csr_matrix(chunk_values.reindex(columns=columns, fill_value=0).to_numpy() == 1, dtype=np.int32)
+
+            intersection = (chunk_binary @ binary_t).toarray()
+            union = row_sizes[:, None] + representative_sizes[None, :] - intersection
+            with np.errstate(divide='ignore', invalid='ignore'):
+                neighbours = (intersection / union >= self.__threshold) & (union > 0)
+            neighbour_counts = sparse.csr_matrix(neighbours, dtype=np.float64) @ membership
+            neighbour_counts = neighbour_counts.toarray()
+            best = np.argmax(neighbour_counts / expected_neighbours, axis=1)
+            has_neighbours = neighbour_counts.max(axis=1) > 0
+            self.__assignments[rows[has_neighbours]] = np.array(cluster_ids, dtype=np.int64)[best[has_neighbours]]
+        return self.__assignments
+
+    def get_cluster_assignments(self):
+        # Number of the cluster (from 0, in the order clusters are reported) of every data point, or -1 if it is in none
+        assignments = np.full(self.__data_size, -1, dtype=np.int64)
+        for number, i in enumerate(self.__clusters):
+            assignments[self.__clusters[i]] = number
+        return assignments
+
+    def get_cluster_info(self):
+        # Report of discovered clusters (see cluster_report), printed as the label counts or labels of each cluster
+        label_codes, labels = pd.factorize(self.__data.iloc[:, 0], use_na_sentinel=False)
+        return cluster_report(labels.tolist(), label_codes, [self.__clusters[i] for i in self.__clusters], self.__classified)
+
+    def get_labelled_cluster_info(self):
+        # Report of discovered clusters, including the rows assigned to them by label_remaining_data
+        label_codes, labels = pd.factorize(pd.Series(self.__row_labels, dtype=object), use_na_sentinel=False)
+        numbers = {i: number for number, i in enumerate(self.__clusters)}
+        assignments = np.array([numbers.get(i, -1) for i in self.__assignments.tolist()], dtype=np.int64)
+        order = np.argsort(assignments, kind='stable')
+        members = np.split(order, np.searchsorted(assignments[order], np.arange(len(numbers) + 1)))[1:-1]
+        return cluster_report(labels.tolist(), label_codes, members, self.__classified)
+
+    def get_attribute_counts(self):
+        # Sparse (CSR) matrix of how many data points in each cluster (a row per cluster, in the order clusters are reported)
+        # have each attribute, i.e. the product of a cluster membership matrix with the binary matrix
+        assignments = self.get_cluster_assignments()
+        points = np.flatnonzero(assignments >= 0)
+        membership = sparse.csr_matrix((np.ones(len(points), dtype=np.int32), (assignments[points], points)), shape=(len(self.__clusters), self.__data_size))
+        return (membership @ self.get_binary_matrix()).tocsr()
+
+    def get_cluster_detail(self, cluster, max_authors = None):
+        # Retrieve authors present in cluster (numbered from 1) + how many times they appear, from most to least frequent
+        # Authors appearing equally often are in the order they are first found in the cluster's conferences
+        # If max_authors is given, only that many of the most frequent authors are sorted & returned (none if it is 0 or less)
+        if max_authors is not None and max_authors <= 0:
+            return OrderedDict()
+        members = self.__clusters[list(self.__clusters.keys())[cluster-1]]
+        binary = self.get_binary_matrix()[members].tocoo()
+        names = self.__data.columns.values[1:]
+
+        counts = np.bincount(binary.col, minlength=len(names))
+        first_found = np.full(len(names), len(members), dtype=np.int64)
+        np.minimum.at(first_found, binary.col, binary.row)
+        authors = np.flatnonzero(counts)
+        if max_authors is not None and max_authors < len(authors):
+            # only authors at least as frequent as the max_authors-th most frequent can be among the most frequent
+            kth_count = np.partition(counts[authors], len(authors) - max_authors)[len(authors) - max_authors]
+            authors = authors[counts[authors] >= kth_count]
+        authors = authors[np.lexsort((authors, first_found[authors], -counts[authors]))][:max_authors]
+
+        return OrderedDict(zip(names[authors].tolist(), counts[authors].tolist()))
 
     def show_cluster_info(self):
         # Display output of get_cluster_info method
@@ -286,10 +936,6 @@ class ROCK:
 
     def show_cluster_detail(self, cluster, max_authors = None):
         # Display output of get_cluster_detail method with optional max number of authors to display
-        authors = self.get_cluster_detail(cluster)
-        if max_authors:
-            for author in list(authors.keys())[:max_authors]:
-                print(f'{author}: {authors[author]}')
-        else:
-            for author in authors:
-                print(f'{author}: {authors[author]}')
+        authors = self.get_cluster_detail(cluster, max_authors if max_authors else None)
+        for author in authors:
+            print(f'{author}: {authors[author]}')
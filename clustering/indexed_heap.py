@@ -0,0 +1,97 @@
+from itertools import count
+from operator import itemgetter
+
+# Estimated bytes used by each entry of an indexed_max_heap (the (priority, key) tuple, its float, its slot in the heap list
+# & its entry in the positions dictionary)
+HEAP_BYTES_PER_ENTRY = 170
+
+class indexed_max_heap:
+    # Binary max heap of (priority, key) entries with at most one entry per key
+    # The position of each key in the heap is tracked, so the entry for any key can be updated or removed in O(log n)
+    # instead of searching the heap for it and re-heapifying
+    def __init__(self, entries = (), ordered = False):
+        # entries: iterable of (priority, key) tuples, heapified in O(n)
+        # If the entries are already in heap order (e.g. sorted from highest to lowest, or taken from entries()) heapifying is skipped
+        self.__heap = list(entries)
+        self.__positions = dict(zip(map(itemgetter(1), self.__heap), count()))
+        if not ordered:
+            for position in reversed(range(len(self.__heap) // 2)):
+                self.__sift_down(position)
+
+    def __len__(self):
+        return len(self.__heap)
+
+    def __contains__(self, key):
+        return key in self.__positions
+
+    def keys(self):
+        return self.__positions.keys()
+
+    def entries(self):
+        # All (priority, key) entries, in heap order
+        return list(self.__heap)
+
+    def get(self, key):
+        return self.__heap[self.__positions[key]][0]
+
+    def peek(self):
+        # Entry with the highest priority
+        return self.__heap[0]
+
+    def push(self, key, priority):
+        # Add an entry for key, or change its priority if it already has one
+        if key in self.__positions:
+            position = self.__positions[key]
+            old_priority = self.__heap[position][0]
+            self.__heap[position] = (priority, key)
+            if priority > old_priority:
+                self.__sift_up(position)
+            else:
+                self.__sift_down(position)
+        else:
+            self.__heap.append((priority, key))
+            self.__positions[key] = len(self.__heap) - 1
+            self.__sift_up(len(self.__heap) - 1)
+
+    def remove(self, key):
+        # Remove the entry for key, if it has one
+        if key not in self.__positions:
+            return
+        position = self.__positions.pop(key)
+        last = self.__heap.pop()
+        if position < len(self.__heap):
+            self.__heap[position] = last
+            self.__positions[last[1]] = position
+            self.__sift_up(position)
+            self.__sift_down(self.__positions[last[1]])
+
+    def pop(self):
+        # Remove & return the entry with the highest priority
+        entry = self.__heap[0]
+        self.remove(entry[1])
+        return entry
+
+    def __swap(self, a, b):
+        self.__heap[a], self.__heap[b] = self.__heap[b], self.__heap[a]
+        self.__positions[self.__heap[a][1]] = a
+        self.__positions[self.__heap[b][1]] = b
+
+    def __sift_up(self, position):
+        while position > 0:
+            parent = (position - 1) // 2
+            if self.__heap[position] <= self.__heap[parent]:
+                break
+            self.__swap(position, parent)
+            position = parent
+
+    def __sift_down(self, position):
+        size = len(self.__heap)
+        while True:
+            largest = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size and self.__heap[child] > self.__heap[largest]:
+                    largest = child
+            if largest == position:
+                break
+            self.__swap(position, largest)
+            position = largest
@@ -0,0 +1,205 @@
+import os, shutil, tempfile, numpy as np
+from scipy import sparse
+
+# Storage for the number of links between clusters while ROCK merges them
+#
+# Link counts are symmetric, non-negative integers that are mostly zero, so two forms are available:
+#   dense_link_store: the upper triangle of the link matrix in the narrowest unsigned integer type that can hold any link count,
+#                     either in memory or, for link matrices too large for memory, in a file opened with np.memmap
+#   sparse_link_store: a dictionary of non-zero links for each cluster (i.e. {i: {j: link[i][j], ...}, ...})
+# Both shrink as clusters are merged away
+
+# Estimated bytes used by each non-zero link in a sparse_link_store (dictionary entry, key & value)
+SPARSE_BYTES_PER_LINK = 100
+
+# Function to choose the narrowest unsigned integer type for a link matrix, given the sum of all of its links
+# The links between two clusters sum the links between their points, so no link count can exceed half the sum of the matrix
+def get_link_dtype(total_links):
+    maximum = int(total_links) // 2
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if maximum <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+def get_dense_memory_usage(num_points, total_links):
+    return num_points * (num_points - 1) // 2 * np.dtype(get_link_dtype(total_links)).itemsize
+
+# Function to create a link store from a sparse (CSR) link matrix between points, of the given kind ('dense', 'sparse' or 'memmap'),
+# or of whichever of 'dense' & 'sparse' needs less memory if kind is 'auto'. directory is where the file of a 'memmap' store is kept
+# clusters optionally lists the clusters with links, if not every point is still a cluster
+def create_link_store(link, kind = 'auto', directory = None, clusters = None):
+    num_points, total_links = link.shape[0], link.data.sum()
+    if kind == 'auto':
+        kind = 'dense' if get_dense_memory_usage(num_points, total_links) <= link.nnz * SPARSE_BYTES_PER_LINK else 'sparse'
+    if kind == 'sparse':
+        return sparse_link_store(link)
+    if kind in ('dense', 'memmap'):
+        store = dense_link_store(num_points, total_links, create_link_file(directory) if kind == 'memmap' else None, clusters)
+        store.add_links(0, link)
+        return store
+    raise ValueError(f"Unknown link store '{kind}', expected 'auto', 'dense', 'sparse' or 'memmap'")
+
+# Function to create an empty file for a 'memmap' link store in directory (the system's temporary directory if None)
+def create_link_file(directory = None):
+    file_descriptor, filename = tempfile.mkstemp(suffix='.link', dir=directory)
+    os.close(file_descriptor)
+    return filename
+
+# Function to copy the file of a 'memmap' store saved by dense_link_store.snapshot to a new file in directory, & open it as a store
+def open_link_snapshot(snapshot_filename, state, directory = None):
+    filename = create_link_file(directory)
+    shutil.copyfile(snapshot_filename, filename)
+    return dense_link_store(len(state['positions']), 0, filename, state=state)
+
+# Function to create a sparse (CSR) link matrix from arrays of links between pairs of clusters, given in one direction only
+def create_symmetric_matrix(num_points, rows, columns, values):
+    return sparse.csr_matrix((np.r_[values, values], (np.r_[rows, columns], np.r_[columns, rows])), shape=(num_points, num_points))
+
+class sparse_link_store:
+    def __init__(self, link):
+        self.__num_points = link.shape[0]
+        self.__rows = {i: dict(zip(link.indices[link.indptr[i]:link.indptr[i+1]].tolist(), link.data[link.indptr[i]:link.indptr[i+1]].tolist()))
+                       for i in range(link.shape[0])}
+
+    def get_kind(self):
+        return 'sparse'
+
+    def get_link_matrix(self):
+        # Sparse (CSR) matrix of the links between the remaining clusters, from which an equivalent store can be created
+        rows = np.array([i for i in self.__rows for j in self.__rows[i]], dtype=np.int64)
+        columns = np.array([j for i in self.__rows for j in self.__rows[i]], dtype=np.int64)
+        values = np.array([value for i in self.__rows for value in self.__rows[i].values()], dtype=np.int64)
+        return sparse.csr_matrix((values, (rows, columns)), shape=(self.__num_points, self.__num_points))
+
+    def get(self, i, j):
+        return self.__rows[i].get(j, 0)
+
+    def get_links(self, i, clusters):
+        # Links between cluster i & each of a list of clusters
+        row = self.__rows[i]
+        return np.array([row.get(x, 0) for x in clusters], dtype=np.int64)
+
+    def merge(self, i, j, clusters, links):
+        # Set the links between cluster i & each of a list of clusters (in both directions), and remove cluster j
+        links = links.tolist()
+        del self.__rows[j]
+        self.__rows[i] = dict(zip(clusters, links))
+        for x, link_x in zip(clusters, links):
+            self.__rows[x][i] = link_x
+            self.__rows[x].pop(j, None)
+
+    def close(self):
+        pass
+
+class dense_link_store:
+    # The upper triangle is stored row by row as one flat array. Each cluster has a position in the triangle, and once half of the
+    # positions belong to clusters that have been merged away the triangle is rebuilt with only the remaining clusters
+    # If a filename is given, the triangle is kept in that file rather than in memory
+    # If a state saved by snapshot is given, the triangle in filename is opened as it is instead of being created
+    def __init__(self, num_points, total_links, filename = None, clusters = None, state = None):
+        self.__dtype = get_link_dtype(total_links)
+        self.__filename = filename
+        if state is not None:
+            self.__dtype = np.dtype(state['dtype']).type
+            self.__positions = state['positions'].copy()
+            self.__size, self.__num_clusters = state['size'], state['num_clusters']
+            self.__triangle = np.memmap(filename, dtype=self.__dtype, mode='r+', shape=(max(self.__size * (self.__size - 1) // 2, 1),))
+            return
+        if clusters is None:
+            self.__positions = np.arange(num_points, dtype=np.int64)
+        else:
+            self.__positions = np.full(num_points, -1, dtype=np.int64)
+            self.__positions[clusters] = np.arange(len(clusters))
+        self.__size = self.__num_clusters = int((self.__positions >= 0).sum())
+        self.__triangle = self.create_triangle(self.__size, filename)
+
+    def get_kind(self):
+        return 'dense' if self.__filename is None else 'memmap'
+
+    def get_link_matrix(self, block_size = 1 << 24):
+        # Sparse (CSR) matrix of the links between the remaining clusters, from which an equivalent store can be created
+        # The triangle is read a block at a time, so a triangle kept on disk is never read into memory as a whole
+        clusters = np.full(self.__size, -1, dtype=np.int64)
+        remaining = np.flatnonzero(self.__positions >= 0)
+        clusters[self.__positions[remaining]] = remaining
+        row_starts = np.arange(self.__size, dtype=np.int64) * self.__size - np.arange(self.__size, dtype=np.int64) * (np.arange(self.__size, dtype=np.int64) + 1) // 2
+
+        rows, columns, values = [], [], []
+        for start in range(0, len(self.__triangle) if self.__size > 1 else 0, block_size):
+            block = np.asarray(self.__triangle[start:start + block_size])
+            indices = np.flatnonzero(block) + start
+            a = np.searchsorted(row_starts, indices, side='right') - 1
+            b = indices - row_starts[a] + a + 1
+            # links of clusters merged away since the triangle was last rebuilt are left in place, & are skipped
+            remaining_links = (clusters[a] >= 0) & (clusters[b] >= 0)
+            rows.append(clusters[a][remaining_links])
+            columns.append(clusters[b][remaining_links])
+            values.append(block[indices - start][remaining_links].astype(np.int64))
+        if len(rows) == 0:
+            rows, columns, values = [np.zeros(0, dtype=np.int64)] * 3
+        return create_symmetric_matrix(len(self.__positions), np.concatenate(rows), np.concatenate(columns), np.concatenate(values))
+
+    def snapshot(self, filename):
+        # Copy the file of a store kept on disk to filename, returning the (small) state needed to open the copy again
+        # (see open_link_snapshot). The triangle is flushed first, so the copy holds every link written so far
+        self.__triangle.flush()
+        shutil.copyfile(self.__filename, filename)
+        return {'dtype': np.dtype(self.__dtype).str, 'positions': self.__positions.copy(), 'size': self.__size, 'num_clusters': self.__num_clusters}
+
+    def create_triangle(self, size, filename):
+        length = size * (size - 1) // 2
+        if filename is None:
+            return np.zeros(length, dtype=self.__dtype)
+        # np.memmap cannot map an empty file. A new file is filled with zeros
+        return np.memmap(filename, dtype=self.__dtype, mode='w+', shape=(max(length, 1),))
+
+    def add_links(self, start, link):
+        # Add the links of a block of rows of a sparse link matrix between points, starting at row start
+        coo = link.tocoo()
+        rows = coo.row + start
+        upper = rows < coo.col
+        self.__triangle[self.get_indices(self.__positions[rows[upper]], self.__positions[coo.col[upper]])] = coo.data[upper]
+
+    def get_indices(self, a, b):
+        # Index in the triangle of the link between the clusters at positions a & b (a != b)
+        a, b = np.minimum(a, b), np.maximum(a, b)
+        return a * self.__size - a * (a + 1) // 2 + b - a - 1
+
+    def get(self, i, j):
+        return int(self.__triangle[self.get_indices(self.__positions[i], self.__positions[j])])
+
+    def get_links(self, i, clusters):
+        # Links between cluster i & each of a list of clusters
+        return self.__triangle[self.get_indices(self.__positions[i], self.__positions[clusters])].astype(np.int64)
+
+    def merge(self, i, j, clusters, links):
+        # Set the links between cluster i & each of a list of clusters, and remove cluster j
+        self.__triangle[self.get_indices(self.__positions[i], self.__positions[clusters])] = links
+        self.__positions[j] = -1
+        self.__num_clusters -= 1
+        if self.__num_clusters <= self.__size // 2:
+            self.compact()
+
+    def compact(self):
+        # Rebuild the triangle with the remaining clusters only, one row at a time
+        remaining = np.flatnonzero(self.__positions >= 0)
+        old_positions = self.__positions[remaining]
+        size = len(remaining)
+        triangle = self.create_triangle(size, None if self.__filename is None else self.__filename + '.compact')
+        start = 0
+        for a in range(size - 1):
+            triangle[start:start + size - a - 1] = self.__triangle[self.get_indices(old_positions[a], old_positions[a + 1:])]
+            start += size - a - 1
+        if self.__filename is not None:
+            del self.__triangle
+            os.replace(self.__filename + '.compact', self.__filename)
+        self.__triangle = triangle
+        self.__size = size
+        self.__positions[remaining] = np.arange(size)
+
+    def close(self):
+        # Delete the file of a store kept on disk
+        if self.__filename is not None and os.path.isfile(self.__filename):
+            del self.__triangle
+            os.remove(self.__filename)
+            self.__filename = None
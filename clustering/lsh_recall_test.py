@@ -0,0 +1,24 @@
+import time
+from clustering import ROCK
+
+# Compare the neighbours found by the approximate (MinHash/LSH) mode of ROCK against the exact all-pairs calculation
+# on the bundled datasets, for a few settings of the recall/speed trade-off
+#   num_hashes: length of each point's MinHash signature
+#   lsh_recall: target probability of finding a pair of points whose similarity is exactly the threshold
+
+datasets = [('house-votes-84.data', 0.73, True), ('dblp_1991_1995_3_10_5', 0.2, False), ('dblp_1991_1995_3_10_5', 0.5, False)]
+settings = [(64, 0.8), (128, 0.95), (256, 0.99)]
+
+for dataset, threshold, binarize in datasets:
+    start = time.perf_counter()
+    exact = ROCK(dataset, threshold, 1, binarize, binarize).create_adjacency_matrix()
+    print(f'{dataset}, threshold {threshold}: {exact.nnz // 2} neighbour pairs found in {time.perf_counter() - start:.2f}s (exact)')
+
+    for num_hashes, lsh_recall in settings:
+        instance = ROCK(dataset, threshold, 1, binarize, binarize, approximate=True, num_hashes=num_hashes, lsh_recall=lsh_recall)
+        start = time.perf_counter()
+        approximate = instance.create_approximate_adjacency_matrix()
+        elapsed = time.perf_counter() - start
+        recall = exact.multiply(approximate).nnz / exact.nnz if exact.nnz else 1.0
+        bands, rows = instance.get_lsh_bands()
+        print(f'\t{num_hashes} hashes, {bands} bands of {rows}: recall {recall:.4f} in {elapsed:.2f}s')
@@ -1,4 +1,5 @@
-import os, sys, pandas as pd, IO_utilities as io_
+import os, sys, itertools, multiprocessing, numpy as np, pandas as pd, event_store
+from scipy import sparse
 from tqdm import tqdm
 
 class dataset_builder():
@@ -8,11 +9,8 @@ class dataset_builder():
         'conf_objects',
         'author_filenames']
 
-        self.__authors = None
-        self.__author_id_lookup = None
-        self.__disambiguation_ids = None
-        self.__confs = None
-        self.__conf_name_lookup = None
+        # Memory mapped event store of author & conference participation, see event_store.py
+        self.__events = None
 
         self._start_year = start_year
         self._end_year = end_year
@@ -27,6 +25,14 @@ class dataset_builder():
         self._conferences_to_include = None
         self._authors_to_include = None
 
+        # Indices into the event store of the included conferences & authors, and the (author, conference) pairs between them
+        self._conf_indices = None
+        self._author_indices = None
+        self._incidence = None
+
+        # Date range & masks of the most recent call to get_year_window
+        self.__year_window = None
+
     def set_conf_freq_threshold(self, threshold):
         self.__conf_freq_threshold = threshold
 
@@ -37,35 +43,44 @@ class dataset_builder():
         self.__crossover_threshold = threshold
 
     def load_essential_files(self):
-        # load conference and author objects from ./data directory
-
-        if not all([os.path.isfile(f'./data/{filename}.pkl') for filename in self.__essential_files]):
-            print("Essential file(s) missing, please run setup file.")
-            sys.exit()
-
-        author_filenames = io_.load('author_filenames')
-        pbar = tqdm(total=len(author_filenames)+1, desc='Loading essential files', leave=False)
-
-        self.__confs = io_.load('conf_objects')
-        pbar.update(1)
+        # open the event store in ./data, converting the conference and author objects from setup into one if necessary
+        if not event_store.exists():
+            if not all([os.path.isfile(f'./data/{filename}.pkl') for filename in self.__essential_files]):
+                print("Essential file(s) missing, please run setup file.")
+                sys.exit()
+            print("Converting author & conference objects into an event store.")
+            event_store.convert_pickles()
 
-        author_filenames = io_.load('author_filenames')
+        self.open_event_store()
 
-        self.__authors = {}
-        for file in author_filenames:
-            temp_dict = io_.load(file)
-            self.__authors.update(temp_dict)
-            pbar.update(1)
-        pbar.close()
+    def open_event_store(self):
+        # open the existing event store in ./data read-only, without converting anything (used by batch workers)
+        self.__events = event_store.event_store()
 
     def set_min_max_years(self):
-        # Loop over conference objects and determine earliest & latest year values
-        for conf_id in self.__confs:
-            for year in self.__confs[conf_id].getYears():
-                if int(year) < self.__min_year:
-                    self.__min_year = int(year)
-                if int(year) > self.__max_year:
-                    self.__max_year = int(year)
+        # Determine earliest & latest years in which any conference was held
+        self.__min_year, self.__max_year = self.__events.getYearRange()
+
+    def get_year_window(self):
+        # Boolean masks over the event & conference year columns for the current date range
+        # The masks of the most recent date range are kept, so parameter sets sharing a date range compute them once
+        start, end = self._date_range[0], self._date_range[-1]
+        if self.__year_window is None or self.__year_window['range'] != (start, end):
+            event_years = np.asarray(self.__events.event_year)
+            held_years = np.asarray(self.__events.held_year)
+            self.__year_window = {
+                'range': (start, end),
+                'events': (event_years >= start) & (event_years <= end),
+                'held': (held_years >= start) & (held_years <= end)}
+        return self.__year_window['events'], self.__year_window['held']
+
+    def get_author_paper_counts(self):
+        # Number of papers each author published within the current date range, kept alongside the year window masks
+        event_window, held_window = self.get_year_window()
+        if 'num_papers' not in self.__year_window:
+            event_author = np.asarray(self.__events.event_author)
+            self.__year_window['num_papers'] = np.bincount(event_author[event_window], minlength=len(self.__events.authors))
+        return self.__year_window['num_papers']
 
     def check_year_params(self):
         # Check that the parameters for start & end years are within min & max years
@@ -97,114 +112,222 @@ class dataset_builder():
             return True
 
     def trim_conferences(self):
-        confs_to_include = []
-        # Loop over conference objects
-        # Loop over years attribute of each conference object
+        # Count the number of years within the date range in which each conference was held
         # If conference was held as many or more times than the threshold, include it
+        held_conf = np.asarray(self.__events.held_conf)
+        num_confs = len(self.__events.confs)
+        event_window, held_window = self.get_year_window()
 
-        pbar = tqdm(total=len(self.__confs), desc='Trimming conferences to meet frequency threshold', leave=True)
-        for conf_id in self.__confs:
-            years_within_date_range = []
-            for year in self.__confs[conf_id].getYears():
-                    if int(year) in self._date_range:
-                        years_within_date_range.append(year)
-
-            if len(years_within_date_range) >= self.__conf_freq_threshold:
-                confs_to_include.append(conf_id)
-            pbar.update(1)
-        pbar.close()
-        return confs_to_include
+        years_within_date_range = np.bincount(held_conf[held_window], minlength=num_confs)
+        # Only conferences with proceedings records are candidates, as papers can reference series that have none
+        has_proceedings = np.bincount(held_conf, minlength=num_confs) > 0
+        self._conf_indices = np.flatnonzero(has_proceedings & (years_within_date_range >= self.__conf_freq_threshold))
+        return [self.__events.confs[i] for i in self._conf_indices]
 
     def trim_authors(self):
-        authors_to_include = set()
-
-        pbar = tqdm(total=len(self.__authors), desc='Trimming authors to meet publication threshold', leave=True)
-
-        # Loop over all author objects & count total number of papers published within year range
-        for author_id in self.__authors:
-            num_papers = 0
-            for year in self.__authors[author_id].papers:
-                if int(year) in self._date_range:
-                    num_papers += len(self.__authors[author_id].papers[year])
-
-            # If author has published a sufficient number of papers
-            if num_papers >= self.__author_pub_threshold:
-                # loop over year keys in author object confs attribute
-                for year in self.__authors[author_id].confs:
-                    # if year is within date range
-                    if int(year) in self._date_range:
-                        # loop over conferences published to in that year
-                        for conf_id in list(self.__authors[author_id].confs[year]):
-                            # if conference id is in conferences_to_include, add author to authors_to_include
-                            if conf_id in self._conferences_to_include:
-                                authors_to_include.add(author_id)
-            pbar.update(1)
-        pbar.close()
-        return authors_to_include
+        # Count the number of papers each author published within the date range
+        # Include authors with a sufficient number of papers that published to at least one included conference
+        event_author = np.asarray(self.__events.event_author)
+        event_conf = np.asarray(self.__events.event_conf)
+        num_authors = len(self.__events.authors)
+        event_window, held_window = self.get_year_window()
+
+        num_papers = self.get_author_paper_counts()
+
+        conf_included = np.zeros(len(self.__events.confs), dtype=bool)
+        conf_included[self._conf_indices] = True
+        included_events = event_window & conf_included[event_conf]
+        published_to_included_conf = np.zeros(num_authors, dtype=bool)
+        published_to_included_conf[event_author[included_events]] = True
+
+        self._author_indices = np.flatnonzero(published_to_included_conf & (num_papers >= self.__author_pub_threshold))
+        return set(self.__events.authors[i] for i in self._author_indices)
 
     def create_dataset(self):
-        dataset = {}
-
-        pbar = tqdm(total=len(self._authors_to_include), desc='Creating dataset', leave=True)
-        # loop over authors_to_include
-        for author_id in self._authors_to_include:
-            dataset[author_id] = set()
-            # loop over year keys in author object confs attribute
-            for year in self.__authors[author_id].confs:
-                # if year is within date range
-                if int(year) in self._date_range:
-                    # loop over conferences published to in that year
-                    for conf_id in list(self.__authors[author_id].confs[year]):
-                        # if conference id is in conferences_to_include, add conf_id to current row of dataset
-                        if conf_id in self._conferences_to_include:
-                            dataset[author_id].add(conf_id)
-            pbar.update(1)
-        pbar.close()
+        # Find every distinct (author, conference) pair within the date range between included authors & conferences
+        event_author = np.asarray(self.__events.event_author)
+        event_conf = np.asarray(self.__events.event_conf)
+        num_confs = len(self.__events.confs)
+        event_window, held_window = self.get_year_window()
+
+        conf_included = np.zeros(num_confs, dtype=bool)
+        conf_included[self._conf_indices] = True
+        author_included = np.zeros(len(self.__events.authors), dtype=bool)
+        author_included[self._author_indices] = True
+        included_events = event_window & conf_included[event_conf] & author_included[event_author]
+
+        pairs = np.unique(event_author[included_events].astype(np.int64) * num_confs + event_conf[included_events])
+        self._incidence = (pairs // num_confs, pairs % num_confs)
+
+        # Map each author id to the set of conference ids they published to
+        author_ids = {i: self.__events.authors[i] for i in self._author_indices}
+        conf_ids = {i: self.__events.confs[i] for i in self._conf_indices}
+        dataset = {author_id: set() for author_id in author_ids.values()}
+        for author_index, conf_index in zip(*self._incidence):
+            dataset[author_ids[author_index]].add(conf_ids[conf_index])
         return dataset
 
-    def create_pandas_dataframe(self, dataset):
-        rows = []
-
-        pbar = tqdm(total=len(self._conferences_to_include), desc='Converting dataset to pandas DataFrame', leave=True)
-        for conf_id in self._conferences_to_include:
-            confs = {}
-            for author_id in dataset:
-                if conf_id in dataset[author_id]:
-                    confs[author_id] = 1
-                else:
-                    confs[author_id] = 0
-            rows.append(confs)
-            pbar.update()
-        pbar.close()
+    def create_sparse_matrix(self, dataset):
+        # Build the conference by author matrix in CSR form, with a 1 wherever an author published to a conference
+        conf_rows = {conf_id: i for i, conf_id in enumerate(self._conferences_to_include)}
+        author_ids = list(dataset)
+        rows, columns = [], []
+        for column, author_id in enumerate(author_ids):
+            for conf_id in dataset[author_id]:
+                rows.append(conf_rows[conf_id])
+                columns.append(column)
+        values = np.ones(len(rows), dtype=np.uint8)
+        matrix = sparse.csr_matrix((values, (rows, columns)), shape=(len(conf_rows), len(author_ids)))
 
         labels = []
         for i in range(len(self._conferences_to_include)):
-            labels.append(self.__confs[self._conferences_to_include[i]].name)
-
-        dataframe = pd.DataFrame(rows, index=labels)
+            labels.append(self.__events.conf_names[self._conf_indices[i]])
 
-        dataframe.loc['Total'] = dataframe.sum()
-        temp_df = dataframe.T
-        # remove authors that contributed to only one conference
-        temp_df = temp_df[temp_df["Total"] >= int(self.__crossover_threshold)]
-        del temp_df["Total"]
+        # remove authors that contributed to fewer conferences than the crossover threshold
+        authors_to_keep = np.flatnonzero(matrix.getnnz(axis=0) >= int(self.__crossover_threshold))
+        matrix = matrix[:, authors_to_keep]
+        author_ids = [author_ids[i] for i in authors_to_keep]
 
-        temp_df.loc['Total'] = temp_df.sum()
-        dataframe = temp_df.T
         # remove any conferences that have no authors
-        dataframe = dataframe[dataframe["Total"] > 1]
-        del dataframe["Total"]
+        confs_to_keep = np.flatnonzero(matrix.getnnz(axis=1) > 1)
+        matrix = matrix[confs_to_keep]
+        labels = [labels[i] for i in confs_to_keep]
 
-        print (f"Dimensions of final matrix: {len(dataframe.index)} conference series by {len(dataframe.columns)} authors.")
+        return matrix, labels, author_ids
+
+    def create_pandas_dataframe(self, dataset, dense = False, dataframe_name = None):
+        # The DataFrame holds the matrix in pandas' sparse format unless a dense DataFrame is requested
+        matrix, labels, author_ids = self.create_sparse_matrix(dataset)
+        if dense:
+            dataframe = pd.DataFrame(matrix.toarray(), index=labels, columns=author_ids)
+        else:
+            dataframe = pd.DataFrame.sparse.from_spmatrix(matrix, index=labels, columns=author_ids)
         dataframe.index.names = ['Conference']
-        dataframe_name = input("Please enter a name for the dataframe: ")
-        dataframe.to_csv('./datasets/X.csv'.replace('X',dataframe_name), encoding='utf-8')
+
+        print (f"Dimensions of final matrix: {len(labels)} conference series by {len(author_ids)} authors.")
+        if dataframe_name is None:
+            dataframe_name = input("Please enter a name for the dataframe: ")
+        save_sparse_matrix('./datasets/X.csv'.replace('X',dataframe_name), matrix, labels, author_ids)
         print("Done. Dataframe saved in ./datasets directory")
+        return dataframe
+
+    def generate_dataset(self, start_year, end_year, conf_freq_threshold, author_pub_threshold, crossover_threshold, dataframe_name):
+        # Generate & save the dataset for one set of parameters without prompting, returning False if the parameters are invalid
+        self._start_year = start_year
+        self._end_year = end_year
+        self.set_conf_freq_threshold(conf_freq_threshold)
+        self.set_author_pub_threshold(author_pub_threshold)
+        self.set_crossover_threshold(crossover_threshold)
+
+        if not self.check_thresholds() or not self.check_year_params():
+            return False
+        self._date_range = range(self._start_year, self._end_year+1)
+
+        self._conferences_to_include = self.trim_conferences()
+        self._authors_to_include = self.trim_authors()
+        dataset = self.create_dataset()
+        self.create_pandas_dataframe(dataset, dataframe_name=dataframe_name)
+        return True
+
+# Per-process dataset builder used by batch workers, set by init_batch_worker
+batch_worker_state = {}
+
+# Function to name a dataset after its parameters, e.g. 1991-1995-3-10-5
+def get_dataset_name(parameters):
+    return '-'.join(str(parameter) for parameter in parameters)
+
+# Function to read parameter sets from a file with five space separated values per line, ignoring blank lines & # comments
+def read_parameter_file(filepath):
+    parameter_sets = []
+    with open(filepath) as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line:
+                parameter_sets.append(tuple(int(arg) for arg in line.split()))
+    return parameter_sets
+
+# Function to expand five comma separated lists of values (e.g. '1990,1991' '1995' '3,4' '10' '5') into every combination
+def expand_parameter_grid(values):
+    values = [[int(value) for value in arg.split(',')] for arg in values]
+    return [parameters for parameters in itertools.product(*values) if parameters[0] <= parameters[1]]
+
+# Pool initializer opening the event store once in each worker process. As the store is memory mapped, its pages are shared
+# The store is created (if necessary) by run_batch before the pool starts, so workers only ever read it
+def init_batch_worker():
+    builder = dataset_builder(None,None,None,None,None)
+    builder.open_event_store()
+    builder.set_min_max_years()
+    batch_worker_state['builder'] = builder
+
+# Worker function generating the datasets for a list of parameter sets with the same date range
+def generate_batch_datasets(parameter_sets):
+    results = []
+    for parameters in parameter_sets:
+        name = get_dataset_name(parameters)
+        results.append((name, batch_worker_state['builder'].generate_dataset(*parameters, dataframe_name=name)))
+    return results
+
+# Function to generate & save a dataset for each parameter set in a process pool
+# Parameter sets are grouped by date range, and each group is split into tasks so that every process has work even if all
+# the sets share one date range. Each worker keeps the year window of its most recent date range, so the sets of a task reuse it
+def run_batch(parameter_sets, num_processes = None):
+    for parameters in parameter_sets:
+        if len(parameters) != 5:
+            print(f'Incorrect number of parameters in {parameters}. 5 expected.')
+            sys.exit()
+
+    # Create the event store (converting the objects from setup if necessary) once, before any worker opens it
+    dataset_builder(None,None,None,None,None).load_essential_files()
+
+    groups = {}
+    for parameters in parameter_sets:
+        groups.setdefault(parameters[:2], []).append(parameters)
 
+    num_processes = num_processes or os.cpu_count()
+    task_size = max(1, -(-len(parameter_sets) // num_processes))
+    tasks = [group[start:start + task_size] for group in groups.values() for start in range(0, len(group), task_size)]
+
+    num_processes = min(num_processes, len(tasks))
+    with multiprocessing.Pool(max(num_processes, 1), initializer=init_batch_worker) as pool:
+        pbar = tqdm(total=len(parameter_sets), desc='Generating datasets')
+        failed = []
+        for results in pool.imap_unordered(generate_batch_datasets, tasks):
+            failed += [name for name, success in results if not success]
+            pbar.update(len(results))
+        pbar.close()
+
+    if failed:
+        print(f"Invalid parameters, no dataset generated for: {', '.join(failed)}")
+    print(f"Done. {len(parameter_sets) - len(failed)} dataframes saved in ./datasets directory")
+
+# Function to write a sparse conference by author matrix to a .csv file, converting only a block of rows to dense form at a time
+def save_sparse_matrix(filepath, matrix, labels, author_ids, rows_per_block = 256):
+    for start in range(0, max(matrix.shape[0], 1), rows_per_block):
+        block = pd.DataFrame(matrix[start:start+rows_per_block].toarray(), index=labels[start:start+rows_per_block], columns=author_ids)
+        block.index.names = ['Conference']
+        block.to_csv(filepath, mode='w' if start == 0 else 'a', header=start == 0, encoding='utf-8')
 
 def main():
+    # Batch mode: generate a dataset for every parameter set without prompting, optionally limiting the number of processes
+    #   python dataset_builder.py --batch parameters.txt [--processes N]
+    #   python dataset_builder.py --grid 1990,1991 1995,2000 3 10,12 5 [--processes N]
+    if '--processes' in sys.argv:
+        position = sys.argv.index('--processes')
+        num_processes = int(sys.argv[position + 1])
+        del sys.argv[position:position + 2]
+    else:
+        num_processes = None
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        run_batch(read_parameter_file(sys.argv[2]), num_processes)
+    elif len(sys.argv) > 1 and sys.argv[1] == '--grid':
+        if len(sys.argv) != 7:
+            print('Incorrect number of parameters provided. 5 expected.')
+            sys.exit()
+        run_batch(expand_parameter_grid(sys.argv[2:]), num_processes)
+
     # If dataset_builder.py was called with command line arguments, generate single dataset
-    if len(sys.argv) > 1:
+    elif len(sys.argv) > 1:
         args = [int(arg) for arg in sys.argv[1:]]
         if len(args) == 5:
             db = dataset_builder(*args)
@@ -1,14 +1,110 @@
-import xml_processor, web_scraper, IO_utilities as io_, os, dblp_objects
+import xml_processor, web_scraper, IO_utilities as io_, event_store, record_state, os, sys, multiprocessing, dblp_objects
 from collections import OrderedDict
 from tqdm import tqdm
 
+# Record types extracted from the dblp xml file, mapped to the key prefix each record must have
+RECORD_TAG_KEYS = {
+    'proceedings': 'conf',
+    'inproceedings': 'conf',
+    'www': 'homepages'}
+
+# Function to find the most recent dblp xml file in the ./data directory, e.g. dblp-2020-08-01
+def find_latest_dump():
+    dumps = sorted(filename[:-4] for filename in os.listdir('./data') if filename.startswith('dblp') and filename.endswith('.xml'))
+    if not dumps:
+        print("No dblp xml file could be found in ./data directory.")
+        sys.exit()
+    return dumps[-1]
+
+# Number of byte ranges the dblp file is split into per process when parsing in parallel
+SHARDS_PER_PROCESS = 4
+
+# Per-process state of the shard workers, set by init_shard_worker
+shard_worker_state = {}
+
+# Function to add the authors of a parsed paper record to a dict of author objects, and an (author id, year, conference id,
+# paper key) event for each author to an event_store_builder, which records exactly which conference each paper was published to
+def add_paper_to_authors(author_objects, paper, author_id_lookup, disambiguation_ids, events = None):
+    paper_conf_id = paper.getConfId()
+    paper_id = paper.key
+    paper_year = paper.year
+    author_ids_for_paper = [author_id_lookup[name] for name in paper.authors]
+    author_ids_for_paper = [id for id in author_ids_for_paper if id not in disambiguation_ids]
+
+    for author_id in author_ids_for_paper:
+        if events is not None:
+            events.add(author_id, int(paper_year), paper_conf_id, paper_id)
+        try:
+            author_objects[author_id].addConf(paper_year,paper_conf_id)
+        except:
+            try:
+                author_objects[author_id].addConfYear(paper_year)
+                author_objects[author_id].addConf(paper_year,paper_conf_id)
+            except:
+                author_objects[author_id] = dblp_objects.dblp_author(author_id)
+                author_objects[author_id].addConfYear(paper_year)
+                author_objects[author_id].addConf(paper_year,paper_conf_id)
+
+        try:
+            author_objects[author_id].addPaper(paper_year,paper_id)
+        except:
+            try:
+                author_objects[author_id].addPaperYear(paper_year)
+                author_objects[author_id].addPaper(paper_year,paper_id)
+            except:
+                #print("Will be interesting if this ever executes...")
+                author_objects[author_id] = dblp_objects.dblp_author(author_id)
+                author_objects[author_id].addPaperYear(paper_year)
+                author_objects[author_id].addPaper(paper_year,paper_id)
+
+# Pool initializer giving each worker process its own extractor and, when creating author objects, the author lookups
+def init_shard_worker(dblp_filename, author_id_lookup = None, disambiguation_ids = None):
+    shard_worker_state['raw_interface'] = xml_processor.extractor(dblp_filename, streaming=True)
+    shard_worker_state['author_id_lookup'] = author_id_lookup
+    shard_worker_state['disambiguation_ids'] = disambiguation_ids
+
+# Worker function returning the conference & author records within a byte range of the dblp file, counts of each tag,
+# and the fingerprints of every record (see record_state)
+def extract_shard_records(shard):
+    confs_xml, authors_xml = [], []
+    counts = dict.fromkeys(RECORD_TAG_KEYS, 0)
+    fingerprints = record_state.record_state_builder(RECORD_TAG_KEYS)
+    records = shard_worker_state['raw_interface'].extract_records_by_tags(RECORD_TAG_KEYS, shard)
+    for tag, record in records:
+        if tag == 'proceedings':
+            confs_xml.append(record)
+        elif tag == 'www':
+            authors_xml.append(record)
+        counts[tag] += 1
+        fingerprints.add_record(tag, record)
+    return confs_xml, authors_xml, counts, fingerprints
+
+# Worker function returning the author objects & events created from the paper records within a byte range of the dblp file
+def create_shard_author_objects(shard):
+    raw_interface = shard_worker_state['raw_interface']
+    author_objects, events = {}, event_store.event_store_builder()
+    for tag, record in raw_interface.extract_records_by_tags({'inproceedings': 'conf'}, shard):
+        paper = raw_interface.parse_paper_record(record)
+        add_paper_to_authors(author_objects, paper, shard_worker_state['author_id_lookup'], shard_worker_state['disambiguation_ids'], events)
+    return author_objects, events
+
 class dataset_builder_setup:
-    def __init__(self, dblp_filename):
-        self.__raw_interface = xml_processor.extractor(dblp_filename)
+    def __init__(self, dblp_filename, streaming = False, num_processes = 1):
+        # Parallel parsing always streams byte ranges of the file, so the file is never loaded as a whole
+        self.__raw_interface = xml_processor.extractor(dblp_filename, streaming or num_processes > 1)
+        self.__dblp_filename = dblp_filename
+        self.__streaming = streaming
+        self.__num_processes = num_processes
+        self.__shards = None
+        if num_processes > 1:
+            self.__shards = self.__raw_interface.find_record_boundaries(RECORD_TAG_KEYS, num_processes * SHARDS_PER_PROCESS)
         self.__web_interface = web_scraper.web_scraper('https://dblp.org')
         self._confs_xml = None
         self._papers_xml = None
         self._authors_xml = None
+        self._record_counts = None
+        # Fingerprints of every record, collected as records are extracted (see record_state)
+        self._record_state = None
 
         self._series_ids = None
         self._conf_series_ids_to_names = None
@@ -16,18 +112,35 @@ class dataset_builder_setup:
         self._disambiguation_ids = None
         self._conf_objects = {}
         self._author_objects = {}
+        # (author id, year, conference id, paper key) of every paper of every author, recorded as author objects are created
+        # in an event_store_builder
+        self._events = None
 
     def extract_all_xml(self):
-        pbar = tqdm(total=3, desc='Extracting conference records... ')
-        self._confs_xml = self.__raw_interface.extract_records_by_tag('proceedings', 'conf')
-        pbar.set_description('Extracting paper records... ')
-        pbar.update(1)
-        self._papers_xml = self.__raw_interface.extract_records_by_tag('inproceedings', 'conf')
-        pbar.set_description('Extracting author records... ')
-        pbar.update(1)
-        self._authors_xml = self.__raw_interface.extract_records_by_tag('www', 'homepages')
-        pbar.set_description('Finished extracting xml')
-        pbar.update(1)
+        if self.is_parallel():
+            self.extract_xml_in_parallel()
+            return
+
+        # Scan the dblp file once, routing each record to the list for its tag as it is encountered
+        # When streaming, paper records are only counted here & are read again by create_author_objects, so that they are
+        # never all held in memory
+        self._confs_xml, self._papers_xml, self._authors_xml = [], None if self.__streaming else [], []
+        consumers = {
+            'proceedings': self._confs_xml.append,
+            'inproceedings': (lambda record: None) if self.__streaming else self._papers_xml.append,
+            'www': self._authors_xml.append}
+        self._record_counts = dict.fromkeys(consumers, 0)
+        self._record_state = record_state.record_state_builder(RECORD_TAG_KEYS)
+
+        pbar = tqdm(desc='Extracting records')
+        for tag, record in self.__raw_interface.extract_records_by_tags(RECORD_TAG_KEYS):
+            consumers[tag](record)
+            self._record_state.add_record(tag, record)
+            self._record_counts[tag] += 1
+            pbar.update(1)
+            if pbar.n % 100000 == 0:
+                pbar.set_postfix(self._record_counts)
+        pbar.set_postfix(self._record_counts)
         pbar.close()
 
     def get_conference_series_ids(self):
@@ -57,8 +170,8 @@ class dataset_builder_setup:
         return conf_objects
 
     def get_disambiguation_authors(self, authors_xml):
-        disambiguation_authors_xml = [author for author in authors_xml if 'disambiguation' in author]
-        disambiguation_ids = [self.__raw_interface.extract_record_component('author_id', author) for author in disambiguation_authors_xml]
+        homepages = map(self.__raw_interface.parse_homepage_record, authors_xml)
+        disambiguation_ids = [homepage.id for homepage in homepages if homepage.disambiguation]
         return disambiguation_ids
 
     def create_author_id_lookup(self, authors_xml):
@@ -66,65 +179,81 @@ class dataset_builder_setup:
 
         pbar = tqdm(total=len(authors_xml))
         for author_record in authors_xml:
-            author_id = self.__raw_interface.extract_record_component('author_id',author_record)
-            author_names = self.__raw_interface.extract_record_component('author_names',author_record)
-            for name in author_names:
+            homepage = self.__raw_interface.parse_homepage_record(author_record)
+            for name in homepage.names:
                 try:
                     print(author_id_lookup[name])
                     print("Houston, we have a fucking problem...")
                 except:
-                    author_id_lookup[name] = author_id
+                    author_id_lookup[name] = homepage.id
             pbar.update(1)
         pbar.close()
         return author_id_lookup
 
-    def create_author_objects(self, papers_xml):
+    def create_author_objects(self, papers_xml = None):
+        # If no paper records are given (streaming mode), they are read from the dblp file in a second streaming scan
+        if papers_xml is None:
+            papers_xml = (record for tag, record in self.__raw_interface.extract_records_by_tags({'inproceedings': RECORD_TAG_KEYS['inproceedings']}))
+            num_papers = self._record_counts['inproceedings'] if self._record_counts else None
+        else:
+            num_papers = len(papers_xml)
         author_objects = {}
-        pbar = tqdm(total=len(papers_xml), desc='Creating author objects')
-        for paper in papers_xml:
-
-            # Get cross reference to conference
-            crossref = self.__raw_interface.extract_record_component('crossref',paper)
-            if not crossref == None:
-                paper_conf_id = crossref.split('/')[1]
-            else:
-                paper_url = self.__raw_interface.extract_record_component('url',paper)
-                paper_conf_id = paper_url.split('/')[2]
-
-            paper_id = self.__raw_interface.extract_record_component('paper_id',paper)
-            paper_year = self.__raw_interface.extract_record_component('conf_year',paper) #CHANGE TO GENERIC YEAR!!
-            author_names = self.__raw_interface.extract_record_component('author_names',paper)
-            author_ids_for_paper = [self._author_id_lookup[name] for name in author_names]
-            author_ids_for_paper = [id for id in author_ids_for_paper if id not in self._disambiguation_ids]
-
-            for author_id in author_ids_for_paper:
-                try:
-                    author_objects[author_id].addConf(paper_year,paper_conf_id)
-                except:
-                    try:
-                        author_objects[author_id].addConfYear(paper_year)
-                        author_objects[author_id].addConf(paper_year,paper_conf_id)
-                    except:
-                        author_objects[author_id] = dblp_objects.dblp_author(author_id)
-                        author_objects[author_id].addConfYear(paper_year)
-                        author_objects[author_id].addConf(paper_year,paper_conf_id)
-
-                try:
-                    author_objects[author_id].addPaper(paper_year,paper_id)
-                except:
-                    try:
-                        author_objects[author_id].addPaperYear(paper_year)
-                        author_objects[author_id].addPaper(paper_year,paper_id)
-                    except:
-                        #print("Will be interesting if this ever executes...")
-                        author_objects[author_id] = dblp_objects.dblp_author(author_id)
-                        author_objects[author_id].addPaperYear(paper_year)
-                        author_objects[author_id].addPaper(paper_year,paper_id)
-
+        self._events = event_store.event_store_builder()
+        pbar = tqdm(total=num_papers, desc='Creating author objects')
+        disambiguation_ids = set(self._disambiguation_ids)
+        for paper_record in papers_xml:
+            # Parse every field needed from the record in a single pass
+            paper = self.__raw_interface.parse_paper_record(paper_record)
+            add_paper_to_authors(author_objects, paper, self._author_id_lookup, disambiguation_ids, self._events)
             pbar.update(1)
         pbar.close()
         return author_objects
 
+    def extract_xml_in_parallel(self):
+        # Scan byte ranges of the dblp file in a process pool, collecting conference & author records
+        # Paper records are far more numerous, so they are left on disk and parsed by create_author_objects_in_parallel
+        self._record_counts = dict.fromkeys(RECORD_TAG_KEYS, 0)
+        self._confs_xml, self._papers_xml, self._authors_xml = [], None, []
+        self._record_state = record_state.record_state_builder(RECORD_TAG_KEYS)
+
+        with multiprocessing.Pool(self.__num_processes, initializer=init_shard_worker, initargs=(self.__dblp_filename,)) as pool:
+            pbar = tqdm(total=len(self.__shards), desc='Extracting records')
+            # imap returns results in shard order, so the record lists are in the same order as a serial scan
+            for confs_xml, authors_xml, counts, fingerprints in pool.imap(extract_shard_records, self.__shards):
+                self._confs_xml.extend(confs_xml)
+                self._authors_xml.extend(authors_xml)
+                self._record_state.extend(fingerprints)
+                for tag in counts:
+                    self._record_counts[tag] += counts[tag]
+                pbar.update(1)
+            pbar.set_postfix(self._record_counts)
+            pbar.close()
+
+    def create_author_objects_in_parallel(self):
+        # Build partial author objects for each byte range in a process pool and merge them in file order
+        author_objects = {}
+        self._events = event_store.event_store_builder()
+        initargs = (self.__dblp_filename, self._author_id_lookup, set(self._disambiguation_ids))
+        with multiprocessing.Pool(self.__num_processes, initializer=init_shard_worker, initargs=initargs) as pool:
+            pbar = tqdm(total=len(self.__shards), desc='Creating author objects')
+            for shard_author_objects, shard_events in pool.imap(create_shard_author_objects, self.__shards):
+                self._events.extend(shard_events)
+                for author_id, author in shard_author_objects.items():
+                    if author_id in author_objects:
+                        author_objects[author_id].merge(author)
+                    else:
+                        author_objects[author_id] = author
+                pbar.update(1)
+            pbar.close()
+        return author_objects
+
+    def save_record_state(self):
+        # Save fingerprints of every record so that dataset_builder_update can later find the records changed in a newer file
+        self._record_state.save()
+
+    def is_parallel(self):
+        return self.__num_processes > 1
+
     def start(self):
         return
 
@@ -138,10 +267,20 @@ def main():
     'author_filenames']
 
     if all([os.path.isfile(f'./data/{filename}.pkl') for filename in essential_files]):
+        # Files created by earlier versions of setup only need converting into an event store
+        if not event_store.exists():
+            print("Converting author & conference objects into an event store.")
+            event_store.convert_pickles()
         print("All essential files exist, dataset builder is ready to use.")
         sys.exit()
 
-    setup = dataset_builder_setup('dblp-2020-08-01')
+    # The dblp file to use can be given as an argument (e.g. dblp-2020-08-01), otherwise the most recent one in ./data is used
+    # Passing --stream reads the dblp file incrementally rather than loading it into memory in one go
+    # Passing --parallel parses byte ranges of the dblp file on every available core
+    filenames = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    dblp_filename = filenames[0] if filenames else find_latest_dump()
+    num_processes = os.cpu_count() if '--parallel' in sys.argv else 1
+    setup = dataset_builder_setup(dblp_filename, '--stream' in sys.argv, num_processes)
     setup.extract_all_xml()
 
     if os.path.isfile('./data/series_ids_to_names.pkl'):
@@ -190,7 +329,10 @@ def main():
             pbar.update(1)
         pbar.close()
     else:
-        setup._author_objects = setup.create_author_objects(setup._papers_xml)
+        if setup.is_parallel():
+            setup._author_objects = setup.create_author_objects_in_parallel()
+        else:
+            setup._author_objects = setup.create_author_objects(setup._papers_xml)
         pbar = tqdm(total=16,desc='Saving author object files to disk. This may take several minutes.', leave=False)
 
         key_copy = list(setup._author_objects.keys())
@@ -212,6 +354,16 @@ def main():
 
         pbar.close()
 
+    if not event_store.exists():
+        if setup._events is not None:
+            event_store.write_events(setup._conf_objects, setup._events)
+        else:
+            # Author objects loaded from an earlier setup do not record which conference each paper was published to
+            event_store.write_event_store(setup._conf_objects, setup._author_objects.values())
+
+    if not record_state.exists():
+        setup.save_record_state()
+
     print("All essential files created, dataset builder is ready to use.")
 
 if __name__ == '__main__':
@@ -0,0 +1,208 @@
+import xml_processor, web_scraper, IO_utilities as io_, event_store, record_state, sys, numpy as np, dblp_objects
+from collections import Counter
+from itertools import islice
+from tqdm import tqdm
+from xml_processor import text_between, AUTHOR_NAMES_PATTERN
+from dataset_builder_setup import RECORD_TAG_KEYS, find_latest_dump
+
+class dataset_builder_update:
+    # Updates the essential files created by setup from a newer dblp file, reparsing only the records that were added, changed or removed
+    def __init__(self, dblp_filename):
+        self.__raw_interface = xml_processor.extractor(dblp_filename, streaming=True)
+        self.__web_interface = web_scraper.web_scraper('https://dblp.org')
+        self.__new_state = record_state.record_state_builder(RECORD_TAG_KEYS)
+
+        # Records that are new or changed in the new file, & keys of records that changed or were removed, by tag
+        self._added_records = {tag: [] for tag in RECORD_TAG_KEYS}
+        self._removed_keys = {tag: [] for tag in RECORD_TAG_KEYS}
+        self._removed_author_ids = set()
+        # Author ids that names on changed or removed homepages belonged to, when those names now belong to another id (or none)
+        self._moved_author_ids = set()
+        # Author ids that were disambiguation pages in the previous file but are not in the new one
+        self._restored_author_ids = set()
+
+        self._conf_series_ids_to_names = io_.load('series_ids_to_names')
+        self._author_id_lookup = io_.load('author_id_lookup')
+        self._disambiguation_ids = io_.load('disambiguation_ids')
+        self._conf_objects = io_.load('conf_objects')
+        self._proceedings_years = io_.load('proceedings_years')
+
+    def find_changed_records(self, batch_size = 100000):
+        # Compare the key & content hashes of every record in the new file with those saved for the previous file
+        old_state = record_state.record_state()
+        old_key_hash = np.asarray(old_state.key_hash)
+        old_content_hash = np.asarray(old_state.content_hash)
+        seen = np.zeros(len(old_key_hash), dtype=bool)
+        tags = list(RECORD_TAG_KEYS)
+
+        records = record_state.scan_records(self.__raw_interface, RECORD_TAG_KEYS)
+        pbar = tqdm(desc='Comparing records')
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            key_hash = np.array([record[3] for record in batch], dtype=np.uint64)
+            content_hash = np.array([record[4] for record in batch], dtype=np.uint64)
+
+            if len(old_key_hash):
+                positions = np.minimum(np.searchsorted(old_key_hash, key_hash), len(old_key_hash) - 1)
+                found = old_key_hash[positions] == key_hash
+                unchanged = found & (old_content_hash[positions] == content_hash)
+                seen[positions[found]] = True
+            else:
+                found = unchanged = np.zeros(len(batch), dtype=bool)
+
+            for i in np.flatnonzero(~unchanged):
+                tag, key, record = batch[i][:3]
+                self._added_records[tag].append(record)
+                # A changed record is removed & then added again
+                if found[i]:
+                    self._removed_keys[tag].append(key)
+            for tag, key, record, record_key_hash, record_content_hash in batch:
+                self.__new_state.add(tag, key, record_key_hash, record_content_hash)
+            pbar.update(len(batch))
+        pbar.close()
+
+        for i in np.flatnonzero(~seen):
+            self._removed_keys[tags[old_state.tag[i]]].append(old_state.keys[i])
+
+        for tag in RECORD_TAG_KEYS:
+            print(f"{tag}: {len(self._added_records[tag])} added or changed, {len(self._removed_keys[tag])} changed or removed")
+
+    def apply_homepage_changes(self):
+        # Remove the names & disambiguation status of changed or removed homepages, then add those of new or changed homepages
+        removed_ids = {key[len('homepages/'):] for key in self._removed_keys['www']}
+        removed_names = {}
+        if removed_ids:
+            removed_names = {name: author_id for name, author_id in self._author_id_lookup.items() if author_id in removed_ids}
+            for name in removed_names:
+                del self._author_id_lookup[name]
+        old_disambiguation_ids = set(self._disambiguation_ids)
+        self._disambiguation_ids = [author_id for author_id in self._disambiguation_ids if author_id not in removed_ids]
+
+        for record in self._added_records['www']:
+            homepage = self.__raw_interface.parse_homepage_record(record)
+            for name in homepage.names:
+                # As in setup, the first author id found for a name is kept
+                self._author_id_lookup.setdefault(name, homepage.id)
+            if homepage.disambiguation:
+                self._disambiguation_ids.append(homepage.id)
+
+        # Papers credited to a name that has moved to another author id (or whose homepage was removed) are parsed again
+        # by apply_paper_changes, so that their events are attributed as a full setup would attribute them
+        self._moved_author_ids = {author_id for name, author_id in removed_names.items() if self._author_id_lookup.get(name) != author_id}
+
+        # Papers by authors that have become disambiguation pages are removed from the event store, and papers by authors that
+        # are no longer disambiguation pages are parsed again by apply_paper_changes, as they have no events yet
+        self._removed_author_ids = set(self._disambiguation_ids) - old_disambiguation_ids
+        self._restored_author_ids = old_disambiguation_ids - set(self._disambiguation_ids)
+
+    def apply_proceedings_changes(self):
+        # Update the years each conference series was held, creating conference objects for new series
+        held = Counter((key.split('/')[1], year) for key, year in self._proceedings_years.items())
+
+        for key in self._removed_keys['proceedings']:
+            conf_id, year = key.split('/')[1], self._proceedings_years.pop(key)
+            held[(conf_id, year)] -= 1
+            if held[(conf_id, year)] == 0 and conf_id in self._conf_objects:
+                self._conf_objects[conf_id].years.discard(year)
+                if not self._conf_objects[conf_id].years:
+                    del self._conf_objects[conf_id]
+
+        added_confs = []
+        for record in self._added_records['proceedings']:
+            conf_id = self.__raw_interface.extract_record_component('conference_id', record)
+            year = int(self.__raw_interface.extract_record_component('conf_year', record))
+            self._proceedings_years[self.__raw_interface.extract_record_component('paper_id', record)] = year
+            held[(conf_id, year)] += 1
+            added_confs.append((conf_id, year))
+
+        new_series_ids = list(dict.fromkeys(conf_id for conf_id, year in added_confs if conf_id not in self._conf_series_ids_to_names))
+        if new_series_ids:
+            self._conf_series_ids_to_names.update(self.__web_interface.retrieve_all_conf_series_names(new_series_ids))
+
+        for conf_id, year in added_confs:
+            if conf_id not in self._conf_objects:
+                self._conf_objects[conf_id] = dblp_objects.dblp_conference(conf_id)
+                self._conf_objects[conf_id].setName(self._conf_series_ids_to_names[conf_id])
+            self._conf_objects[conf_id].addYear(year)
+
+    def add_reattributed_papers(self):
+        # Treat unchanged papers as changed if a full setup would now attribute them differently, finding their records with
+        # another scan of the file: the papers of authors in _moved_author_ids (found from their events in the event store), and
+        # papers with a name of an author in _restored_author_ids (found from the names in each record, as they have no events)
+        if not self._moved_author_ids and not self._restored_author_ids:
+            return
+        paper_keys = set()
+        if self._moved_author_ids:
+            store = event_store.event_store()
+            author_indices = [i for i, author_id in enumerate(store.authors) if author_id in self._moved_author_ids]
+            paper_keys = {store.papers[i] for i in np.unique(np.asarray(store.event_paper)[np.isin(store.event_author, author_indices)]).tolist()}
+            del store
+        restored_names = {name for name, author_id in self._author_id_lookup.items() if author_id in self._restored_author_ids}
+        # Papers that are new or changed are already parsed
+        parsed_keys = set(self._removed_keys['inproceedings'])
+        parsed_keys.update(text_between(record, 'key="', '"') for record in self._added_records['inproceedings'])
+
+        num_papers = 0
+        for tag, key, record, key_hash, content_hash in record_state.scan_records(self.__raw_interface, {'inproceedings': RECORD_TAG_KEYS['inproceedings']}):
+            if key in parsed_keys:
+                continue
+            if key in paper_keys or (restored_names and not restored_names.isdisjoint(AUTHOR_NAMES_PATTERN.findall(record))):
+                self._removed_keys['inproceedings'].append(key)
+                self._added_records['inproceedings'].append(record)
+                num_papers += 1
+        print(f"{len(self._moved_author_ids)} author(s) lost names to other authors & {len(self._restored_author_ids)} are no longer disambiguation pages, parsing {num_papers} of their unchanged paper(s) again.")
+
+    def apply_paper_changes(self):
+        # Remove the events of changed or removed papers from the event store and add events for new or changed papers
+        self.add_reattributed_papers()
+        disambiguation_ids = set(self._disambiguation_ids)
+        new_events = []
+        missing_names = set()
+        for record in tqdm(self._added_records['inproceedings'], desc='Parsing new papers'):
+            paper = self.__raw_interface.parse_paper_record(record)
+            paper_conf_id = paper.getConfId()
+            missing_names.update(name for name in paper.authors if name not in self._author_id_lookup)
+            author_ids_for_paper = [self._author_id_lookup[name] for name in paper.authors if name in self._author_id_lookup]
+            for author_id in author_ids_for_paper:
+                if author_id not in disambiguation_ids:
+                    new_events.append((author_id, paper.year, paper_conf_id, paper.key))
+        if missing_names:
+            print(f"{len(missing_names)} author name(s) of new or reparsed papers have no homepage, their papers are left out for them.")
+        event_store.update_event_store(self._conf_objects, self._removed_keys['inproceedings'], new_events, removed_author_ids=self._removed_author_ids)
+
+    def save(self):
+        io_.save('series_ids_to_names', self._conf_series_ids_to_names)
+        io_.save('author_id_lookup', self._author_id_lookup)
+        io_.save('disambiguation_ids', self._disambiguation_ids)
+        io_.save('conf_objects', self._conf_objects)
+        self.__new_state.proceedings_years = self._proceedings_years
+        self.__new_state.save()
+
+def main():
+    # Usage: python dataset_builder_update.py [new dblp filename] [--base previous dblp filename]
+    # If no filename is given, the most recent dblp xml file in ./data is used
+    # --base creates the record fingerprints of the file setup was run on, if setup was run before fingerprints were saved
+    args = sys.argv[1:]
+    if '--base' in args:
+        position = args.index('--base')
+        base_filename = args[position + 1]
+        del args[position:position + 2]
+        if not record_state.exists():
+            record_state.write_record_state(xml_processor.extractor(base_filename, streaming=True), RECORD_TAG_KEYS)
+
+    if not event_store.exists() or not record_state.exists():
+        print("Event store or record fingerprints missing, please run setup file.")
+        sys.exit()
+
+    update = dataset_builder_update(args[0] if args else find_latest_dump())
+    update.find_changed_records()
+    update.apply_homepage_changes()
+    update.apply_proceedings_changes()
+    update.apply_paper_changes()
+    update.save()
+    print("Essential files updated, dataset builder is ready to use.")
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import os, io, re, html, codecs, locale
 from tqdm import tqdm
 from itertools import (takewhile, repeat)
 
@@ -18,3 +19,90 @@ def load_dblp_file(dblp_file_path):
             pbar.update(1)
     pbar.close()
     return dblp_content
+
+# Function to convert the raw text of a record into the form returned by xml_processor.extractor
+# Newlines are removed and html entities (including those declared in dblp.dtd, e.g. &uuml;) are converted
+def clean_record(record):
+    return html.unescape(record.replace('\n', ''))
+
+# Generator yielding the text of the dblp xml file between two byte offsets in fixed size chunks
+# Bytes are decoded and newlines translated in the same way as open() in text mode
+def read_text_chunks(dblp_file_path, start=0, end=None, chunk_size=1024*1024):
+    decoder = codecs.getincrementaldecoder(locale.getpreferredencoding(False))()
+    decoder = io.IncrementalNewlineDecoder(decoder, translate=True)
+    with open(dblp_file_path, 'rb') as f:
+        f.seek(start)
+        position = start
+        while True:
+            size = chunk_size if end is None else min(chunk_size, end - position)
+            data = f.read(size) if size > 0 else b''
+            position += len(data)
+            yield decoder.decode(data, final=not data)
+            if not data:
+                break
+
+# Function to split the dblp xml file into byte ranges for parallel parsing
+# Every range after the first begins at the opening tag of a record in tag_keys, so no such record is split between ranges
+def find_record_boundaries(dblp_file_path, tag_keys, num_ranges, chunk_size=1024*1024):
+    open_tag = re.compile(b'<(' + b'|'.join(re.escape(tag.encode()) for tag in tag_keys) + rb')[\s>]')
+    max_tag_length = max(len(tag) for tag in tag_keys) + 2
+    file_size = os.path.getsize(dblp_file_path)
+
+    boundaries = [0]
+    with open(dblp_file_path, 'rb') as f:
+        for i in range(1, num_ranges):
+            position = max(file_size * i // num_ranges, boundaries[-1] + 1)
+            while position < file_size:
+                f.seek(position)
+                data = f.read(chunk_size)
+                start = open_tag.search(data)
+                if start:
+                    position += start.start()
+                    break
+                elif len(data) < chunk_size:
+                    position = file_size
+                else:
+                    # Keep the end of the chunk in case an opening tag is split across chunks
+                    position += len(data) - max_tag_length
+            if position >= file_size:
+                break
+            boundaries.append(position)
+    boundaries.append(file_size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+# Generator yielding (tag, record) pairs from the dblp xml file for each record whose tag is in tag_keys
+# tag_keys maps each tag to the prefix its key attribute must have (e.g. {'www': 'homepages'}), or None to keep all records
+# The file is read in fixed size chunks, so at most one chunk plus one partial record is held in memory at any time
+# start & end restrict the scan to a byte range, as returned by find_record_boundaries
+def stream_dblp_records(dblp_file_path, tag_keys, chunk_size=1024*1024, start=0, end=None, progress=True):
+    open_tag = re.compile('<(' + '|'.join(map(re.escape, tag_keys)) + r')(?=[\s>])')
+    key_filters = {tag: f'key="{key}' for tag, key in tag_keys.items() if key}
+    # Length of the longest opening tag, used to keep a possibly split '<tag' at the end of the buffer
+    max_tag_length = max(len(tag) for tag in tag_keys) + 2
+
+    if progress:
+        pbar = tqdm(total=file_line_count(dblp_file_path), desc='Streaming dblp file', leave=False)
+    buffer = ""
+    for chunk in read_text_chunks(dblp_file_path, start, end, chunk_size):
+        buffer += chunk
+        position = 0
+        while True:
+            record_start = open_tag.search(buffer, position)
+            if not record_start:
+                position = max(position, len(buffer) - max_tag_length)
+                break
+            tag = record_start.group(1)
+            record_end = buffer.find(f'</{tag}>', record_start.end())
+            if record_end == -1:
+                # Record continues in the next chunk
+                position = record_start.start()
+                break
+            record = buffer[record_start.end():record_end]
+            if tag not in key_filters or key_filters[tag] in record:
+                yield tag, clean_record(record)
+            position = record_end + len(tag) + 3
+        if progress:
+            pbar.update(buffer.count('\n', 0, position))
+        buffer = buffer[position:]
+    if progress:
+        pbar.close()
@@ -1,43 +1,138 @@
+from array import array
+
+class id_table:
+    # Interns strings (e.g. conference ids or paper keys) as consecutive integers
+    # so that objects can store compact integer arrays instead of many references to strings
+    __slots__ = ('ids', 'indices')
+    def __init__(self):
+        self.ids = []
+        self.indices = {}
+    def intern(self,string):
+        index = self.indices.get(string)
+        if index is None:
+            index = self.indices[string] = len(self.ids)
+            self.ids.append(string)
+        return index
+    def lookup(self,index):
+        return self.ids[index]
+
+# Process-wide tables shared by all author objects. Objects are pickled with the original strings,
+# so pickles do not depend on the order in which ids were interned
+conf_id_table = id_table()
+paper_id_table = id_table()
+
 class dblp_author:
+    # Years are stored as ints, and papers & conferences as arrays of indices into paper_id_table & conf_id_table
+    __slots__ = ('id', 'papers', 'confs')
     def __init__(self,author_id):
         self.id = author_id
         self.papers = {}
         self.confs = {}
     def addPaperYear(self,year):
-        if year not in self.papers.keys():
-            self.papers[year] = []
+        year = int(year)
+        if year not in self.papers:
+            self.papers[year] = array('i')
     def addPaper(self,year,paper_id):
-        self.papers[year].append(paper_id)
+        self.papers[int(year)].append(paper_id_table.intern(paper_id))
     def addConfYear(self,year):
-        if year not in self.confs.keys():
-            self.confs[year] = set()
+        year = int(year)
+        if year not in self.confs:
+            self.confs[year] = array('i')
     def addConf(self,year,conf_id):
-        self.confs[year].add(conf_id)
+        confs = self.confs[int(year)]
+        conf_index = conf_id_table.intern(conf_id)
+        if conf_index not in confs:
+            confs.append(conf_index)
+    def getPapers(self,year):
+        # Paper ids published in a year
+        return [paper_id_table.lookup(index) for index in self.papers[year]]
+    def getConfs(self,year):
+        # Set of conference ids published to in a year
+        return {conf_id_table.lookup(index) for index in self.confs[year]}
+    def merge(self,other):
+        # Add the papers & conferences of another object for the same author, e.g. one built from a later part of the dblp file
+        for year in other.papers:
+            self.addPaperYear(year)
+            self.papers[year].extend(other.papers[year])
+        for year in other.confs:
+            self.addConfYear(year)
+            for conf_index in other.confs[year]:
+                if conf_index not in self.confs[year]:
+                    self.confs[year].append(conf_index)
+    def __getstate__(self):
+        return {
+            'id': self.id,
+            'papers': {year: self.getPapers(year) for year in self.papers},
+            'confs': {year: self.getConfs(year) for year in self.confs}}
+    def __setstate__(self,state):
+        # Also accepts the state of objects pickled before years & ids were interned, which have string years
+        self.id = state['id']
+        self.papers = {}
+        self.confs = {}
+        for year, paper_ids in state['papers'].items():
+            self.addPaperYear(year)
+            for paper_id in paper_ids:
+                self.addPaper(year, paper_id)
+        for year, conf_ids in state['confs'].items():
+            self.addConfYear(year)
+            for conf_id in conf_ids:
+                self.addConf(year, conf_id)
     def getInfo(self):
         papers_output = "Papers:\n"
         for year in self.papers.keys():
-            papers_output += ("\t" + year + ":\n")
-            for paper_id in self.papers[year]:
+            papers_output += ("\t" + str(year) + ":\n")
+            for paper_id in self.getPapers(year):
                 papers_output += ("\t\t" + paper_id + "\n")
         confs_output = "Conferences:\n"
         for year in self.confs.keys():
-            confs_output += ("\t" + year + ":\n")
-            for conf_id in self.confs[year]:
+            confs_output += ("\t" + str(year) + ":\n")
+            for conf_id in self.getConfs(year):
                 confs_output += ("\t\t" + conf_id + "\n")
         info = "ID:" + self.id + "\n" + confs_output + papers_output + "\n"
         return info
 class dblp_conference:
+    # Years are stored as ints
+    __slots__ = ('id', 'name', 'years')
     def __init__(self,conf_id):
         self.id = conf_id
         self.name = "N/A"
         self.years = set()
     def addYear(self,year):
-        self.years.add(year)
+        self.years.add(int(year))
     def setName(self,name):
         self.name = name
         # Use lxml/html, connect to dblp & retrieve name of conference
+    def __getstate__(self):
+        return {'id': self.id, 'name': self.name, 'years': self.years}
+    def __setstate__(self,state):
+        # Also accepts the state of objects pickled before years were stored as ints
+        self.id = state['id']
+        self.name = state['name']
+        self.years = {int(year) for year in state['years']}
     def getInfo(self):
-        info = "ID:" + str(self.id) + "\n" + "Name:" + str(self.name) + "\n" + "Years held:" + str(self.years) + "\n"
+        years = {str(year) for year in self.years}
+        info = "ID:" + str(self.id) + "\n" + "Name:" + str(self.name) + "\n" + "Years held:" + str(years) + "\n"
         return info
     def getYears(self):
         return list(self.years)
+class dblp_paper:
+    # Fields of an inproceedings record used during setup, as parsed by extractor.parse_paper_record
+    __slots__ = ('key', 'crossref', 'url', 'year', 'authors')
+    def __init__(self,key,crossref,url,year,authors):
+        self.key = key
+        self.crossref = crossref
+        self.url = url
+        self.year = year
+        self.authors = authors
+    def getConfId(self):
+        # Conference series id is taken from the crossref to the proceedings where present, otherwise from the url
+        if self.crossref is not None:
+            return self.crossref.split('/')[1]
+        return self.url.split('/')[2]
+class dblp_homepage:
+    # Fields of a www homepage record, as parsed by extractor.parse_homepage_record
+    __slots__ = ('id', 'names', 'disambiguation')
+    def __init__(self,author_id,names,disambiguation):
+        self.id = author_id
+        self.names = names
+        self.disambiguation = disambiguation
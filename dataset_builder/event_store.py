@@ -0,0 +1,239 @@
+import os, sys, shutil, numpy as np, IO_utilities as io_
+from array import array
+from tqdm import tqdm
+
+# Columnar on-disk store of author & conference participation, opened with np.memmap
+#
+# Each paper credited to an author is one event, stored as four parallel integer columns:
+#   event_author, event_year, event_conf, event_paper
+# Each year a conference series was held is stored as two parallel columns:
+#   held_conf, held_year
+# Author ids, conference ids, conference names & paper keys are stored as string tables indexed by those columns
+
+EVENT_STORE_PATH = './data/event_store'
+
+EVENT_COLUMNS = {
+    'event_author': np.int32,
+    'event_year': np.int16,
+    'event_conf': np.int32,
+    'event_paper': np.int32}
+
+HELD_COLUMNS = {
+    'held_conf': np.int32,
+    'held_year': np.int16}
+
+STRING_TABLES = ['authors', 'confs', 'conf_names', 'papers']
+
+class string_table:
+    # Table of strings stored as one block of utf-8 bytes & the offset of each string within it
+    def __init__(self, offsets, data):
+        self.__offsets = offsets
+        self.__data = data
+    def __len__(self):
+        return len(self.__offsets) - 1
+    def __getitem__(self, i):
+        return bytes(self.__data[self.__offsets[i]:self.__offsets[i+1]]).decode('utf-8')
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+    def tolist(self):
+        return list(self)
+
+class event_store:
+    # Read-only view of an event store on disk. Columns are memory mapped, so opening the store reads no data
+    # and the pages are shared between processes using the same store
+    def __init__(self, path = EVENT_STORE_PATH):
+        if not exists(path):
+            print(f"No event store found at {path}, please run setup file.")
+            sys.exit()
+        self.path = path
+        for column in list(EVENT_COLUMNS) + list(HELD_COLUMNS):
+            setattr(self, column, load_column(path, column))
+        for table in STRING_TABLES:
+            setattr(self, table, string_table(load_column(path, f'{table}_offsets'), load_column(path, f'{table}_data')))
+
+    def getYearRange(self):
+        # Earliest & latest years in which any conference was held
+        if len(self.held_year) == 0:
+            return None
+        return int(self.held_year.min()), int(self.held_year.max())
+
+# Function to check whether an event store has been written to path
+def exists(path = EVENT_STORE_PATH):
+    return all(os.path.isfile(f'{path}/{column}.npy') for column in list(EVENT_COLUMNS) + list(HELD_COLUMNS))
+
+def load_column(path, name):
+    return np.load(f'{path}/{name}.npy', mmap_mode='r')
+
+def save_column(path, name, values, dtype):
+    np.save(f'{path}/{name}.npy', np.asarray(values, dtype=dtype))
+
+def save_string_table(path, name, strings):
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    save_column(path, f'{name}_offsets', offsets, np.int64)
+    save_column(path, f'{name}_data', np.frombuffer(b''.join(encoded), dtype=np.uint8), np.uint8)
+
+class event_store_builder:
+    # Collects events as they are recorded (e.g. by setup as each paper is parsed) in the integer columns of an event store,
+    # so no Python object is kept per event. Author ids, conference ids & paper keys are numbered in order of first appearance
+    def __init__(self):
+        self.author_ids, self.conf_ids, self.paper_ids = [], [], []
+        self.__author_index, self.__conf_index, self.__paper_index = {}, {}, {}
+        self.columns = [array('i'), array('h'), array('i'), array('i')]
+    def __len__(self):
+        return len(self.columns[0])
+    def add(self, author_id, year, conf_id, paper_id):
+        self.columns[0].append(get_or_append_index(self.__author_index, self.author_ids, author_id))
+        self.columns[1].append(int(year))
+        self.columns[2].append(get_or_append_index(self.__conf_index, self.conf_ids, conf_id))
+        self.columns[3].append(get_or_append_index(self.__paper_index, self.paper_ids, paper_id))
+    def extend(self, other):
+        # Add the events of another builder (e.g. one per byte range of the dblp file) after those already added,
+        # renumbering its ids to this builder's
+        tables = [(self.__author_index, self.author_ids, other.author_ids), None,
+                  (self.__conf_index, self.conf_ids, other.conf_ids), (self.__paper_index, self.paper_ids, other.paper_ids)]
+        for column, other_column, table in zip(self.columns, other.columns, tables):
+            if table is None:
+                column.extend(other_column)
+                continue
+            index, ids, other_ids = table
+            numbers = np.array([get_or_append_index(index, ids, string) for string in other_ids], dtype=np.intc)
+            column.frombytes(numbers[np.frombuffer(other_column, dtype=np.intc)].tobytes())
+    def save(self, conf_objects, path = EVENT_STORE_PATH):
+        # Write the events as an event store, with the conferences of conf_objects numbered first
+        # Papers may be credited to conference series with no proceedings record of their own, which are named 'N/A'
+        conf_ids = list(conf_objects)
+        conf_index = {conf_id: i for i, conf_id in enumerate(conf_ids)}
+        numbers = np.array([get_or_append_index(conf_index, conf_ids, conf_id) for conf_id in self.conf_ids], dtype=np.intc)
+        conf_names = [conf_objects[conf_id].name if conf_id in conf_objects else 'N/A' for conf_id in conf_ids]
+        event_conf = numbers[np.frombuffer(self.columns[2], dtype=np.intc)]
+        held_columns = create_held_columns(conf_objects, conf_index)
+        save_event_store(path, [self.columns[0], self.columns[1], event_conf, self.columns[3]], held_columns, [self.author_ids, conf_ids, conf_names, self.paper_ids])
+
+# Function to write an event store from conference objects and events, either an event_store_builder or an iterable of
+# (author id, year, conference id, paper key) tuples
+def write_events(conf_objects, events, path = EVENT_STORE_PATH, total = None):
+    if not isinstance(events, event_store_builder):
+        builder = event_store_builder()
+        for event in tqdm(events, total=total, desc='Writing event store', leave=False):
+            builder.add(*event)
+        events = builder
+    events.save(conf_objects, path)
+
+# Function to determine which of an author's conferences each of their papers in a given year was published to
+# Only used to convert author objects pickled by earlier versions of setup, which record the papers & conferences of each year
+# separately: a paper is matched to the conference series in its key (conf/<series>/...) where the author has that conference
+# in that year. Any remaining papers are matched to the remaining conferences in order, so every conference of every year is
+# covered by at least one paper. This is a guess, as a paper's conference comes from its crossref, which need not match its key
+def match_papers_to_confs(paper_ids, conf_ids):
+    conf_ids = sorted(conf_ids)
+    matched = []
+    unmatched_confs = set(conf_ids)
+    for paper_id in paper_ids:
+        parts = paper_id.split('/')
+        conf_id = parts[1] if len(parts) > 2 and parts[1] in conf_ids else None
+        unmatched_confs.discard(conf_id)
+        matched.append(conf_id)
+    unmatched_confs = sorted(unmatched_confs)
+    for i in range(len(matched)):
+        if matched[i] is None:
+            matched[i] = unmatched_confs.pop(0) if unmatched_confs else conf_ids[0]
+    return matched
+
+# Generator yielding the events of pickled author objects, matching papers to conferences with match_papers_to_confs
+def get_author_object_events(author_objects):
+    for author in author_objects:
+        for year in author.papers:
+            paper_ids = author.getPapers(year)
+            conf_ids_for_year = author.getConfs(year) if year in author.confs else {'N/A'}
+            for paper_id, conf_id in zip(paper_ids, match_papers_to_confs(paper_ids, conf_ids_for_year)):
+                yield author.id, year, conf_id, paper_id
+
+# Function to write an event store from conference objects and an iterable of author objects pickled by earlier versions of setup
+def write_event_store(conf_objects, author_objects, path = EVENT_STORE_PATH):
+    write_events(conf_objects, get_author_object_events(author_objects), path)
+
+# Function to write the columns & string tables of an event store, in the order of EVENT_COLUMNS, HELD_COLUMNS & STRING_TABLES
+# Files are written to a temporary directory and then moved into place, so an existing store that is open is not modified
+def save_event_store(path, event_columns, held_columns, string_tables):
+    temp_path = path + '.tmp'
+    os.makedirs(temp_path, exist_ok=True)
+    for name, values in zip(EVENT_COLUMNS, event_columns):
+        save_column(temp_path, name, values, EVENT_COLUMNS[name])
+    for name, values in zip(HELD_COLUMNS, held_columns):
+        save_column(temp_path, name, values, HELD_COLUMNS[name])
+    for name, strings in zip(STRING_TABLES, string_tables):
+        save_string_table(temp_path, name, strings)
+
+    os.makedirs(path, exist_ok=True)
+    for filename in os.listdir(temp_path):
+        os.replace(f'{temp_path}/{filename}', f'{path}/{filename}')
+    shutil.rmtree(temp_path)
+
+# Function to generate the held_conf & held_year columns from conference objects, given the index of each conference id
+def create_held_columns(conf_objects, conf_index):
+    held_conf, held_year = array('i'), array('h')
+    for conf_id in conf_objects:
+        for year in sorted(conf_objects[conf_id].getYears()):
+            held_conf.append(conf_index[conf_id])
+            held_year.append(int(year))
+    return held_conf, held_year
+
+# Function to find the position of a string in a list of ids using its index, appending it if not present
+def get_or_append_index(index, ids, string):
+    if string not in index:
+        index[string] = len(ids)
+        ids.append(string)
+    return index[string]
+
+# Function to rewrite an event store with the events of some papers removed and new events added
+# new_events is a list of (author id, year, conference id, paper key) tuples. Ids not yet in the string tables are appended,
+# so the indices used by existing events are unchanged. Conference names & years held are taken from conf_objects
+# Every event of an author in removed_author_ids (e.g. authors that have become disambiguation pages) is also removed
+def update_event_store(conf_objects, removed_paper_keys, new_events, path = EVENT_STORE_PATH, removed_author_ids = ()):
+    store = event_store(path)
+    author_ids, conf_ids, paper_ids = store.authors.tolist(), store.confs.tolist(), store.papers.tolist()
+    author_index = {author_id: i for i, author_id in enumerate(author_ids)}
+    conf_index = {conf_id: i for i, conf_id in enumerate(conf_ids)}
+    paper_index = {paper_id: i for i, paper_id in enumerate(paper_ids)}
+
+    # Drop the events of removed papers. Papers that changed are removed & added again under the same index
+    removed = [paper_index[paper_id] for paper_id in removed_paper_keys if paper_id in paper_index]
+    keep = ~np.isin(store.event_paper, removed)
+    keep &= ~np.isin(store.event_author, [author_index[author_id] for author_id in removed_author_ids if author_id in author_index])
+    columns = [np.asarray(store.event_author)[keep], np.asarray(store.event_year)[keep],
+               np.asarray(store.event_conf)[keep], np.asarray(store.event_paper)[keep]]
+
+    for conf_id in conf_objects:
+        get_or_append_index(conf_index, conf_ids, conf_id)
+    added = [array('i'), array('h'), array('i'), array('i')]
+    for author_id, year, conf_id, paper_id in new_events:
+        added[0].append(get_or_append_index(author_index, author_ids, author_id))
+        added[1].append(int(year))
+        added[2].append(get_or_append_index(conf_index, conf_ids, conf_id))
+        added[3].append(get_or_append_index(paper_index, paper_ids, paper_id))
+    columns = [np.concatenate([column, np.asarray(values, dtype=column.dtype)]) for column, values in zip(columns, added)]
+
+    old_names = store.conf_names.tolist()
+    conf_names = [conf_objects[conf_id].name if conf_id in conf_objects else (old_names[i] if i < len(old_names) else 'N/A')
+                  for i, conf_id in enumerate(conf_ids)]
+    held_columns = create_held_columns(conf_objects, conf_index)
+    del store
+    save_event_store(path, columns, held_columns, [author_ids, conf_ids, conf_names, paper_ids])
+
+# Generator yielding the author objects saved in the authors_N.pkl files one file at a time
+def load_pickled_authors():
+    for filename in io_.load('author_filenames'):
+        yield from io_.load(filename).values()
+
+# Function to convert the conf_objects.pkl & authors_N.pkl files created by earlier versions of setup into an event store
+def convert_pickles(path = EVENT_STORE_PATH):
+    if not all(os.path.isfile(f'./data/{filename}.pkl') for filename in ['conf_objects', 'author_filenames']):
+        print("conf_objects.pkl or author_filenames.pkl missing, please run setup file.")
+        sys.exit()
+    write_event_store(io_.load('conf_objects'), load_pickled_authors(), path)
+
+if __name__ == '__main__':
+    convert_pickles()
+    print(f"Event store written to {EVENT_STORE_PATH}")
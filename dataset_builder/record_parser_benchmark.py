@@ -0,0 +1,49 @@
+import sys, time, xml_processor
+from itertools import islice
+
+# Micro-benchmark comparing per-field extract_record_component calls against the one-pass parse_paper_record
+# Usage: python record_parser_benchmark.py [dblp filename in ./data without .xml] [number of records]
+
+def extract_fields_per_component(raw_interface, record):
+    # The per-field extraction previously used by dataset_builder_setup.create_author_objects
+    crossref = raw_interface.extract_record_component('crossref', record)
+    if not crossref == None:
+        conf_id = crossref.split('/')[1]
+    else:
+        conf_id = raw_interface.extract_record_component('url', record).split('/')[2]
+    paper_id = raw_interface.extract_record_component('paper_id', record)
+    year = raw_interface.extract_record_component('conf_year', record)
+    author_names = raw_interface.extract_record_component('author_names', record)
+    return (paper_id, conf_id, year, author_names)
+
+def extract_fields_one_pass(raw_interface, record):
+    paper = raw_interface.parse_paper_record(record)
+    return (paper.key, paper.getConfId(), paper.year, paper.authors)
+
+def time_extraction(function, raw_interface, records):
+    start = time.perf_counter()
+    results = [function(raw_interface, record) for record in records]
+    return time.perf_counter() - start, results
+
+def main():
+    dblp_filename = sys.argv[1] if len(sys.argv) > 1 else 'dblp-2020-08-01'
+    num_records = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+
+    raw_interface = xml_processor.extractor(dblp_filename, streaming=True)
+    records = raw_interface.extract_records_by_tags({'inproceedings': 'conf'})
+    records = [record for tag, record in islice(records, num_records)]
+
+    old_time, old_results = time_extraction(extract_fields_per_component, raw_interface, records)
+    new_time, new_results = time_extraction(extract_fields_one_pass, raw_interface, records)
+
+    if old_results != new_results:
+        print("Parsed fields differ between the two methods.")
+        sys.exit(1)
+
+    print(f"{len(records)} inproceedings records")
+    print(f"extract_record_component: {old_time:.3f}s ({1e6 * old_time / len(records):.1f}us per record)")
+    print(f"parse_paper_record:       {new_time:.3f}s ({1e6 * new_time / len(records):.1f}us per record)")
+    print(f"Speedup: {old_time / new_time:.1f}x")
+
+if __name__ == '__main__':
+    main()
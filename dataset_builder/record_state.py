@@ -0,0 +1,79 @@
+import os, hashlib, numpy as np, IO_utilities as io_, event_store
+from array import array
+from tqdm import tqdm
+from xml_processor import text_between
+
+# Fingerprints of the records of the dblp file the essential files were built from, used to find changed records in a newer file
+#
+# For every record, stored in order of key_hash:
+#   key_hash, content_hash: 64 bit hashes of the record's key & of its full text
+#   tag: position of the record's tag in the tag_keys used to scan the file
+#   keys: string table of the keys themselves, so that removed records can be identified
+# The year of each proceedings record is saved separately in proceedings_years.pkl
+
+RECORD_STATE_PATH = './data/record_state'
+
+def hash_string(string):
+    return int.from_bytes(hashlib.blake2b(string.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def exists(path = RECORD_STATE_PATH):
+    return all(os.path.isfile(f'{path}/{name}.npy') for name in ['key_hash', 'content_hash', 'tag'])
+
+class record_state:
+    # Memory mapped view of saved record fingerprints
+    def __init__(self, path = RECORD_STATE_PATH):
+        self.key_hash = event_store.load_column(path, 'key_hash')
+        self.content_hash = event_store.load_column(path, 'content_hash')
+        self.tag = event_store.load_column(path, 'tag')
+        self.keys = event_store.string_table(event_store.load_column(path, 'keys_offsets'), event_store.load_column(path, 'keys_data'))
+
+class record_state_builder:
+    # Collects the fingerprints of records as they are scanned (by setup, in the same scan that extracts them)
+    def __init__(self, tag_keys):
+        self.__tags = list(tag_keys)
+        self.__key_hash = array('Q')
+        self.__content_hash = array('Q')
+        self.__tag = array('B')
+        self.__keys = []
+        self.proceedings_years = {}
+    def add(self, tag, key, key_hash, content_hash):
+        self.__key_hash.append(key_hash)
+        self.__content_hash.append(content_hash)
+        self.__tag.append(self.__tags.index(tag))
+        self.__keys.append(key)
+    def add_record(self, tag, record):
+        # Fingerprint a record as returned by xml_processor.extractor, keeping the year of proceedings records
+        key = text_between(record, 'key="', '"')
+        self.add(tag, key, hash_string(key), hash_string(record))
+        if tag == 'proceedings':
+            self.proceedings_years[key] = int(text_between(record, '<year>', '</year>'))
+    def extend(self, other):
+        # Add the fingerprints collected by another builder, e.g. for a later byte range of the same file
+        self.__key_hash.extend(other.__key_hash)
+        self.__content_hash.extend(other.__content_hash)
+        self.__tag.extend(other.__tag)
+        self.__keys.extend(other.__keys)
+        self.proceedings_years.update(other.proceedings_years)
+    def save(self, path = RECORD_STATE_PATH):
+        os.makedirs(path, exist_ok=True)
+        key_hash = np.asarray(self.__key_hash, dtype=np.uint64)
+        order = np.argsort(key_hash, kind='stable')
+        event_store.save_column(path, 'key_hash', key_hash[order], np.uint64)
+        event_store.save_column(path, 'content_hash', np.asarray(self.__content_hash, dtype=np.uint64)[order], np.uint64)
+        event_store.save_column(path, 'tag', np.asarray(self.__tag, dtype=np.uint8)[order], np.uint8)
+        event_store.save_string_table(path, 'keys', [self.__keys[i] for i in order])
+        io_.save('proceedings_years', self.proceedings_years)
+
+# Generator yielding (tag, key, record, key hash, content hash) for every record with a tag in tag_keys, read in a single streaming scan
+def scan_records(raw_interface, tag_keys):
+    for tag, record in raw_interface.extract_records_by_tags(tag_keys):
+        key = text_between(record, 'key="', '"')
+        yield tag, key, record, hash_string(key), hash_string(record)
+
+# Function to save the fingerprints of every record of a dblp file, given an extractor for that file
+# Setup fingerprints records as it extracts them, so this is only needed for files setup was run on before fingerprints were saved
+def write_record_state(raw_interface, tag_keys, path = RECORD_STATE_PATH):
+    builder = record_state_builder(tag_keys)
+    for tag, record in tqdm(raw_interface.extract_records_by_tags(tag_keys), desc='Saving record fingerprints'):
+        builder.add_record(tag, record)
+    builder.save(path)
@@ -1,18 +1,56 @@
 import os.path, re, html, sys, dblp_file_loader
 from tqdm import tqdm
+from dblp_objects import (dblp_paper, dblp_homepage)
+
+# Compiled pattern used by the record parsers to find every author of a record
+AUTHOR_NAMES_PATTERN = re.compile(r'<author[^>]*>([\s\S]*?)</author>')
+
+# Function to retrieve the text between the first occurrence of start and the following occurrence of end within a record
+def text_between(record, start, end):
+    position = record.find(start)
+    if position == -1:
+        return None
+    position += len(start)
+    return record[position:record.find(end, position)]
 
 class extractor:
     # Constructor
-    def __init__(self, dblp_filename):
+    def __init__(self, dblp_filename, streaming = False):
         self.__dblp_filepath = "./data/" + dblp_filename + ".xml"
         self.__dblp_file = ""
+        self.__streaming = streaming
         # Check if specified dblp file is present in ./data directory
         if not os.path.isfile(self.__dblp_filepath):
             print(f"File {dblp_filename}.xml could not be found in ./data directory.")
             sys.exit()
-        else:
+        elif not streaming:
+            # In streaming mode the file is read incrementally by stream_records instead
             self.__dblp_file = dblp_file_loader.load_dblp_file(self.__dblp_filepath)
 
+    def find_record_boundaries(self, tag_keys, num_ranges):
+        # Splits the dblp file into (start, end) byte ranges that do not split any record with a tag in tag_keys
+        return dblp_file_loader.find_record_boundaries(self.__dblp_filepath, tag_keys, num_ranges)
+
+    def extract_records_by_tags(self, tag_keys, byte_range = None):
+        # Yields (tag, record) pairs for several tags in a single scan of the dblp file, in file order
+        # tag_keys maps each tag to the key prefix records must have, e.g. {'www': 'homepages'}, or None to keep all
+        # byte_range restricts a streaming scan to one (start, end) range from find_record_boundaries
+        if byte_range:
+            start, end = byte_range
+            yield from dblp_file_loader.stream_dblp_records(self.__dblp_filepath, tag_keys, start=start, end=end, progress=False)
+            return
+        elif self.__streaming:
+            # Records are read from disk as they are needed without loading the whole file into memory
+            yield from dblp_file_loader.stream_dblp_records(self.__dblp_filepath, tag_keys)
+            return
+
+        tags = '|'.join(map(re.escape, tag_keys))
+        re_string = re.compile(rf"<({tags})(?=[\s>])([\s\S]*?)</\1>")
+        for match in re_string.finditer(self.__dblp_file):
+            tag, record = match.group(1), match.group(2)
+            if not tag_keys[tag] or f"key=\"{tag_keys[tag]}" in record:
+                yield tag, dblp_file_loader.clean_record(record)
+
     def extract_records_by_tag(self, tag, tag_key = None):
         re_string = f"<{tag}([\s\S]*?)</{tag}>"
         if tag_key:
@@ -61,6 +99,23 @@ class extractor:
             return None
         return result
         
+    def parse_paper_record(self, record):
+        # Extract the key, crossref, url, year & author names of an inproceedings record with one call
+        # Equivalent to calling extract_record_component for each of those components, using plain string searches
+        return dblp_paper(
+            text_between(record, 'key="', '"'),
+            text_between(record, '<crossref>', '</crossref>'),
+            text_between(record, '<url>', '</url>'),
+            text_between(record, '<year>', '</year>'),
+            AUTHOR_NAMES_PATTERN.findall(record))
+
+    def parse_homepage_record(self, record):
+        # Extract the author id, author names & disambiguation status of a www record with one call
+        return dblp_homepage(
+            text_between(record, 'homepages/', '"'),
+            AUTHOR_NAMES_PATTERN.findall(record),
+            'disambiguation' in record)
+
     def check_tag_present(self, tag, record):
         re_string = f'<{tag}'
         if re.search(re_string, record):